@@ -1,7 +1,22 @@
 import bpy
+import os
 import re
+import time
+import numpy as np
+from typing import NamedTuple
 from bpy.types import Context, Object, Image, NodeTree, ShaderNodeTexImage, ShaderNodeOutputMaterial, ShaderNodeBsdfDiffuse, ShaderNodeNormalMap, Material
-from . Settings import MSFSBake_Settings
+from . Settings import MSFSBake_Settings, MIN_RES, MAX_UNTILED_RES, source_objects, target_objects
+from . Transfer import TexelTransfer, rasterize
+from . MeshCache import bake_object, joined_object, evaluated_mesh, release
+from . Tiles import TiledBake
+from . Output import ImageWriter, FORMAT_EXTENSIONS, FLOAT_FORMATS, pull_pixels, clear_pixels, pack_occlusion, read_output
+from . Padding import coverage, pad, coverage_path, load_coverage
+from . Manifest import BakeManifest, MANIFEST_NAME, mesh_hash, image_hash, settings_hash, input_hash
+from . Stats import stats
+from . Profile import RenderProfile
+from . Distance import estimate, make_cage
+from . Prefilter import prefilter_textures
+from . Partial import SNAPSHOT_SUFFIX, take_snapshot, save_snapshot, load_snapshot, drop_snapshot, snapshot_hash, affected_faces, keep_faces, uv_coverage, merge_region
 
 SRC_OBJ_NAME = "MSFSBake_Input_Object_Copy"
 DST_OBJ_NAME = "MSFSBake_Output_Object_Copy"
@@ -10,166 +25,818 @@ SRC_MATERIAL_NAME = "MSFSBake_Input_Material"
 DST_MATERIAL_NAME = "MSFSBake_Output_Material"
 DST_TEXTURE_NAME  = "MSFSBake_Output_Texture"
 
-def apply_modifiers(obj):
-    ctx = bpy.context.copy()
-    ctx['object'] = obj
-    for _, m in enumerate(obj.modifiers):
+class BakeTarget(NamedTuple):
+    dst_obj: Object
+    width: int
+    height: int
+    prefix: str
+    # Smaller LODs filtered down from this one's outputs
+    derived: tuple = ()
+    # Every part sharing the texture when baking an atlas, dst_obj is the first of them
+    parts: tuple = ()
+
+
+# Name of the output format settings for each map
+OUTPUT_SETTINGS = {
+    'DIFFUSE': "diffuse",
+    'NORMAL': "normal",
+    'COMPOSITE': "composite",
+}
+
+
+# Bake type, enable flag and output file suffix for each map
+MAPS = (
+    ('DIFFUSE', "render_is_diffuse_enabled", "ABLD"),
+    ('NORMAL', "render_is_normal_enabled", "NORM"),
+    ('COMPOSITE', "render_is_composite_enabled", "COMP"),
+)
+
+# Preview bakes run at a fraction of the output size, with occlusion samples capped
+PREVIEW_SCALE = 8
+PREVIEW_AO_SAMPLES = 16
+
+# Atlas parts are checked for overlapping UVs at this resolution
+ATLAS_CHECK_RES = 512
+
+# Share of a part's texels another part may also cover, islands that only touch share a few
+ATLAS_OVERLAP_TOLERANCE = 0.01
+
+# Share of a derived LOD's texels allowed outside the layout of its parent, simplified islands shift a little
+DERIVED_LAYOUT_TOLERANCE = 0.02
+
+
+def get_targets(settings: MSFSBake_Settings) -> list[BakeTarget]:
+    if not settings.use_lod_queue and settings.use_dst_collection:
+        parts = tuple(target_objects(settings))
+        return [BakeTarget(parts[0] if parts else None, settings.output_width, settings.output_height, settings.output_file_prefix, parts=parts)]
+    if not settings.use_lod_queue:
+        return [BakeTarget(settings.dst_obj, settings.output_width, settings.output_height, settings.output_file_prefix)]
+
+    # Derived LODs ride along with the closest baked LOD above them
+    targets = []
+    for lod in settings.lod_targets:
+        target = BakeTarget(lod.dst_obj, lod.output_width, lod.output_height, lod.output_file_prefix)
+        if lod.derive and targets:
+            targets[-1] = targets[-1]._replace(derived=targets[-1].derived + (target,))
+        else:
+            targets.append(target)
+    return targets
+
+
+def preview_target(target: BakeTarget) -> BakeTarget:
+    # The same target at a fraction of its size, nothing derived from it
+    return target._replace(width=max(target.width // PREVIEW_SCALE, MIN_RES),
+                           height=max(target.height // PREVIEW_SCALE, MIN_RES), derived=())
+
+
+class BakeProgress:
+    # Shared with the panel so it can draw the state of a running bake
+    def __init__(self):
+        self.running = False
+        self.cancel_requested = False
+        self.stage = ""
+        self.done = 0
+        self.total = 0
+        self.start_time = 0.0
+
+    def start(self, total: int) -> None:
+        self.running = True
+        self.cancel_requested = False
+        self.stage = ""
+        self.done = 0
+        self.total = total
+        self.start_time = time.perf_counter()
+
+    def advance(self, stage: str) -> None:
+        self.done += 1
+        self.stage = stage
+
+    def stop(self) -> None:
+        self.running = False
+        self.cancel_requested = False
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start_time
+
+    def eta(self) -> float | None:
+        # Stages are assumed to cost about the same, good enough for an estimate
+        if self.done == 0:
+            return None
+        return self.elapsed() / self.done * max(self.total - self.done, 0)
+
+
+progress = BakeProgress()
+
+
+class BakeJob:
+    # One bake run, split into stages so it can run all at once or one stage per timer tick
+    def __init__(self, settings: MSFSBake_Settings, preview: bool = False):
+        self.settings = settings
+        self.targets = get_targets(settings)
+        # A preview bakes the first target small and fast, keeping the pixels instead of writing files
+        self.preview = preview
+        self.previews : dict[str, tuple[np.ndarray, bool]] = {}
+        if preview:
+            self.targets = [preview_target(t) for t in self.targets[:1]]
+        self.tiled = settings.use_tiled_bake and not preview
+        # Changed regions are merged into whole outputs, so never for tiles or previews
+        self.partial = settings.use_partial_rebake and not self.tiled and not preview
+        self.maps = [m for m in MAPS if getattr(settings, m[1])]
+        self.sources = source_objects(settings)
+        # Every material slot of every source as (source index, slot index), with its material and resolved textures
+        self.slots : list[tuple[int, int]] = []
+        self.slot_materials : list[Material | None] = []
+        self.slot_textures : list[dict[str, Image | None]] = []
+
+        # Source image hashes, computed once per bake since packed images hash every pixel
+        self.image_hashes : dict[str, str] = {}
+
+        # Stages dropped because their outputs were already up to date
+        self.skipped = 0
+
+        # Temporary data, removed again when the job ends for any reason
+        self.objs : list[Object] = []
+        self.mats : list[Material] = []
+        self.images : list[Image] = []
+        self.files : list[str] = []
+
+        # Ray distance, extrusion and cage of the target being baked
+        self.rays = (settings.render_ray_dist, settings.render_extrusion)
+        self.cage : Object | None = None
+
+        # Render settings changed for the bake, restored with the rest of the cleanup
+        self.profile : RenderProfile | None = None
+
+        # Outputs being written in the background, recorded in the manifest once done
+        self.writer : ImageWriter | None = None
+        self.writes : list[tuple] = []
+
+    def validate(self) -> str | None:
+        settings = self.settings
+        targets = self.targets
+
+        # Basic validation
+        if settings.use_lod_queue and len(targets) == 0:
+            return "LOD queue is empty"
+
+        if settings.use_src_collection and settings.src_collection is not None and not self.sources:
+            return "Source collection has no visible meshes"
+
+        if settings.use_dst_collection and not settings.use_lod_queue and settings.dst_collection is not None and not targets[0].parts:
+            return "Atlas collection has no visible meshes"
+
+        if not self.sources or any(t.dst_obj is None for t in targets):
+            return "Input or target object not set"
+
+        if any(obj in self.sources for t in targets for obj in (t.parts or (t.dst_obj,))):
+            return "Input and target objects can not be the same"
+
+        if len(self.maps) == 0:
+            return "No textures selected to bake"
+
+        if settings.use_lod_queue and settings.lod_targets[0].derive:
+            return "The first LOD can not be derived"
+
+        derived = [(t, d) for t in targets for d in t.derived]
+        if any(d.width > t.width or d.height > t.height for t, d in derived):
+            return "Derived LODs can not be larger than the LOD they are derived from"
+
+        if derived and self.tiled:
+            return "Derived LODs need an untiled bake"
+
+        if self.tiled:
+            if settings.bake_engine != 'CYCLES':
+                return "Tiled baking needs the Cycles engine"
+            if any(output_format(settings, m[0])[0] != 'PNG8' for m in self.maps):
+                return "Tiled baking only writes 8-bit PNG files"
+        elif any(max(t.width, t.height) > MAX_UNTILED_RES for t in targets):
+            return f"Resolutions above {MAX_UNTILED_RES} need tiled baking"
+
+        # Sources without slots still get one, baked with the defaults
+        self.slots = [(k, i) for k, obj in enumerate(self.sources) for i in range(max(len(obj.material_slots), 1))]
+        self.slot_materials = [self.sources[k].material_slots[i].material if self.sources[k].material_slots else None
+                               for k, i in self.slots]
+        if not any(self.slot_materials):
+            return "Input object has no material"
+
+        # Get input images, slots without a map get a plain default for it
+        self.slot_textures = [resolve_textures(mat) for mat in self.slot_materials]
+
+        # Texture validation
+        if settings.render_is_diffuse_enabled and not any(t['DIFFUSE'] for t in self.slot_textures):
+            return "No color map found on input object to bake"
+
+        if settings.render_is_normal_enabled and not any(t['NORMAL'] for t in self.slot_textures):
+            return "No normal map found on input object to bake"
+
+        if settings.render_is_composite_enabled and not any(t['COMPOSITE'] for t in self.slot_textures):
+            return "No composite map found on input object to bake"
+
+        if settings.bake_engine == 'TRANSFER':
+            if any(o.data.uv_layers.active is None for o in self.sources) or any(t.dst_obj.data.uv_layers.active is None for t in targets):
+                return "Input or target object has no UV map"
+            # N-gons are triangulated for their tangents, loose geometry has nothing to transfer
+            if any(len(o.data.polygons) == 0 for o in [*self.sources, *(t.dst_obj for t in targets)]):
+                return "Texel Transfer needs faces on the input and target objects"
+
+        for target in targets:
+            if not target.parts:
+                continue
+            if any(obj.data.uv_layers.active is None for obj in target.parts):
+                return "Every atlas part needs a UV map"
+            overlaps = overlapping_parts(target.parts)
+            if overlaps:
+                return f"Atlas parts overlap in UV space: {', '.join(f'{a} and {b}' for a, b in overlaps[:3])}"
+
+        # Derived LODs are filtered from the texture of their parent, so they have to use its layout
+        for target, lod in derived:
+            if lod.dst_obj is None or lod.dst_obj.data.uv_layers.active is None or target.dst_obj.data.uv_layers.active is None:
+                return "Derived LODs and the LOD they are derived from need a UV map"
+            if not shares_layout(lod.dst_obj, target.dst_obj):
+                return f"{lod.dst_obj.name} does not share the UV layout of {target.dst_obj.name}, bake it instead of deriving it"
+
+        return None
+
+    def missing_maps(self) -> list[str]:
+        # Material slots that fall back to a default for one of the enabled maps
+        missing = []
+        for material, textures in zip(self.slot_materials, self.slot_textures):
+            names = [suffix for bake_type, _, suffix in self.maps if textures[bake_type] is None]
+            if names and material is not None:
+                missing.append(f"{material.name} ({', '.join(names)})")
+        return missing
+
+    def tile_count(self, target: BakeTarget) -> int:
+        if not self.tiled:
+            return 1
+        size = self.settings.tile_size
+        return -(-target.width // size) * -(-target.height // size)
+
+    def tile_padding(self) -> int:
+        # Tiles are bordered by the widest padding of any map, so each one pads seamlessly
+        return max(map_padding(self.settings, m[0]) for m in self.maps)
+
+    def uses_occlusion(self, bake_type: str) -> bool:
+        return bake_type == 'COMPOSITE' and self.settings.use_composite_ao
+
+    def passes(self, bake_type: str) -> int:
+        # Composite maps with geometry occlusion bake twice per tile
+        return 2 if self.uses_occlusion(bake_type) else 1
+
+    def estimates_distances(self) -> bool:
+        settings = self.settings
+        return settings.use_auto_distance or (settings.use_auto_cage and settings.bake_engine == 'CYCLES')
+
+    def reach(self) -> float | None:
+        # How far from changed source geometry the texels of the target can change, None when rays are unlimited
+        if self.rays[0] <= 0:
+            return None
+        distance = self.rays[0] + self.rays[1]
+        if any(self.uses_occlusion(m[0]) for m in self.maps):
+            distance += self.settings.ao_distance
+        return distance
+
+    def stage_count(self) -> int:
+        total = 2
+        for target in self.targets:
+            total += 1 + sum(self.tile_count(target) * self.passes(m[0]) + 1 for m in self.maps)
+            if self.estimates_distances():
+                total += 1
+            if self.settings.use_prefilter:
+                total += 1
+            if self.settings.bake_engine == 'TRANSFER':
+                total += 1
+            if self.partial:
+                total += 1
+        # Waiting for the last writes
+        return total + 1 - self.skipped
+
+    def steps(self):
+        # Yields the name of the next stage before running it
+        settings = self.settings
+        try:
+            # The source copies and their materials are shared by every target
+            yield "Evaluating source"
+            srcs = [bake_object(obj, SRC_OBJ_NAME) for obj in self.sources]
+            self.objs.extend(srcs)
+
+            yield "Setting up source materials"
+            # One temporary material per slot, so every slot of every source is baked in the same pass
+            src_mats = [setup_source_material(settings, textures) for textures in self.slot_textures]
+            for src in srcs:
+                src.data.materials.clear()
+            for (k, _), (src_mat, _) in zip(self.slots, src_mats):
+                self.mats.append(src_mat)
+                srcs[k].data.materials.append(src_mat)
+            slot_objects = [(srcs[k], i) for k, i in self.slots]
+
+            self.writer = ImageWriter()
+            manifest = BakeManifest(output_path(settings.output_folder, MANIFEST_NAME))
+            src_hash = input_hash(*[mesh_hash(src) for src in srcs])
+            base_hash = settings_hash(settings)
+
+            transfer = None
+            if settings.bake_engine == 'TRANSFER':
+                slot_counts = [sum(1 for k, _ in self.slots if k == n) for n in range(len(srcs))]
+                transfer = TexelTransfer(srcs, slot_counts, settings.render_ray_dist, settings.render_extrusion)
+            # The occlusion pass is a Cycles bake for either engine
+            if transfer is None or any(self.uses_occlusion(m[0]) for m in self.maps):
+                self.profile = RenderProfile(bpy.context.scene)
+                self.profile.apply(settings, 'FAST' if self.preview else settings.bake_profile)
+
+            for target in self.targets:
+                yield f"{target.prefix}: Setting up target"
+                # Tiled bakes only ever hold one tile in memory
+                if self.tiled:
+                    image_size = settings.tile_size + 2 * self.tile_padding()
+                    dst, dst_mat, image_out = setup_target(target, image_size, image_size, False)
+                else:
+                    float_buffer = any(output_format(settings, m[0])[0] in FLOAT_FORMATS for m in self.maps)
+                    dst, dst_mat, image_out = setup_target(target, target.width, target.height, float_buffer)
+                self.objs.append(dst)
+                self.mats.append(dst_mat)
+                self.images.append(image_out)
+
+                # Adjust position, a collection or atlas is taken as already in place
+                if settings.obj_align and not settings.use_src_collection and not target.parts:
+                    dst.location = srcs[0].location
+
+                # Only bake maps whose inputs changed since their output was written
+                dst_hash = mesh_hash(dst)
+                pending = []
+                repads = []
+                for bake_type, _, suffix in self.maps:
+                    fmt, level, block_format = output_format(settings, bake_type)
+                    output = output_path(settings.output_folder, f"{target.prefix}_{suffix}{FORMAT_EXTENSIONS[fmt]}")
+                    # Everything but the meshes, outputs that only differ in those can be merged into
+                    base = input_hash(base_hash, bake_type, target.width, target.height, fmt, level, block_format,
+                                      *[image_hash(t[bake_type], self.image_hashes) for t in self.slot_textures])
+                    digest = input_hash(src_hash, dst_hash, base)
+                    derived = []
+                    for lod in target.derived:
+                        lod_output = output_path(settings.output_folder, f"{lod.prefix}_{suffix}{FORMAT_EXTENSIONS[fmt]}")
+                        derived.append((lod, lod_output, input_hash(digest, lod.width, lod.height, settings.derive_filter)))
+                    outputs = [(output, digest)] + [(o, d) for _, o, d in derived]
+                    padding = map_padding(settings, bake_type)
+                    entries = [manifest.current_entry(o, d) for o, d in outputs]
+                    if settings.force_rebake or self.preview or any(e is None for e in entries):
+                        pending.append((bake_type, suffix, output, digest, base, derived))
+                    elif all(e.get("padding") == padding for e in entries):
+                        self.skipped += self.tile_count(target) * self.passes(bake_type) + 1
+                    else:
+                        # Only the padding changed, so the output is padded again from the coverage kept with it
+                        mask = load_coverage(coverage_path(output), target.width, target.height) if entries[0].get("coverage") else None
+                        if mask is None:
+                            pending.append((bake_type, suffix, output, digest, base, derived))
+                        else:
+                            repads.append((bake_type, suffix, output, digest, entries[0], derived, mask))
+                            self.skipped += self.tile_count(target) * self.passes(bake_type)
+
+                for bake_type, suffix, output, digest, entry, derived, mask in repads:
+                    yield f"{target.prefix}: Re-padding {suffix}"
+                    is_linear = entry["linear"]
+                    pixels = read_output(output, output_format(settings, bake_type)[0], bake_type, is_linear)
+                    # Back to what the bake left around the islands, then padded at the new size
+                    pixels[~mask] = 0.0
+                    self.save_outputs(output, digest, {"base": entry.get("base", ""), "geometry": entry.get("geometry", "")},
+                                      pixels, mask, bake_type, is_linear, derived)
+                    del pixels, mask
+
+                if self.estimates_distances() and not pending:
+                    self.skipped += 1
+                elif self.estimates_distances():
+                    yield f"{target.prefix}: Estimating ray distances"
+                    bpy.context.view_layer.update()
+                    distances = estimate(srcs, dst)
+                    if settings.use_auto_distance:
+                        self.rays = (distances.ray_dist, distances.extrusion)
+                    if settings.use_auto_cage and transfer is None:
+                        self.cage = make_cage(dst, distances.vertex_extrusion)
+                        self.objs.append(self.cage)
+
+                # Source textures sized for this target, swapped into the source materials
+                textures = self.slot_textures
+                if settings.use_prefilter and not pending:
+                    self.skipped += 1
+                elif settings.use_prefilter:
+                    yield f"{target.prefix}: Prefiltering source textures"
+                    textures = prefilter_textures(slot_objects, dst, self.slot_textures, [m[0] for m in self.maps], target.width, target.height,
+                                                  self.image_hashes)
+                    for (src_mat, src_nodes), slot in zip(src_mats, textures):
+                        for bake_type, node in src_nodes['IMAGES'].items():
+                            node.image = slot[bake_type]
+
+                # Only faces near geometry that changed since the last bake, when every output can take a merge
+                snapshot_path = output_path(settings.output_folder, f"{target.prefix}{SNAPSHOT_SUFFIX}")
+                snapshot = region = None
+                geometry = ""
+                if not self.partial and pending and not self.preview:
+                    drop_snapshot(snapshot_path)
+                if self.partial and not pending:
+                    self.skipped += 1
+                elif self.partial:
+                    yield f"{target.prefix}: Finding changed regions"
+                    bpy.context.view_layer.update()
+                    snapshot = take_snapshot(srcs, dst, self.rays)
+                    geometry = snapshot_hash(snapshot)
+                    previous = load_snapshot(snapshot_path)
+                    mergeable = not settings.force_rebake and previous is not None and all(
+                        output_format(settings, bake_type)[0] != 'DDS' and manifest.is_mergeable(output, base, snapshot_hash(previous))
+                        for bake_type, _, output, _, base, _ in pending)
+                    reach = self.reach()
+                    faces = affected_faces(previous, snapshot, reach) if mergeable and reach is not None else None
+                    if faces is not None:
+                        region = uv_coverage(snapshot, target.width, target.height)
+                        keep_faces(dst, faces)
+                        # A cage has to match the target face for face
+                        if self.cage is not None:
+                            keep_faces(self.cage, faces)
+
+                if transfer is not None and not pending:
+                    self.skipped += 1
+                elif transfer is not None:
+                    yield f"{target.prefix}: Building texel correspondence"
+                    # Make sure the aligned location is reflected in matrix_world
+                    bpy.context.view_layer.update()
+                    transfer.ray_dist, transfer.extrusion = self.rays
+                    corr = transfer.correspondence(dst, target.width, target.height)
+
+                tiles = None
+                if self.tiled and pending:
+                    tiles = TiledBake(dst, target.width, target.height, settings.tile_size, self.tile_padding())
+
+                for bake_type, suffix, output, digest, base, derived in pending:
+                    if tiles is not None:
+                        yield from self.bake_tiled(tiles, srcs, dst, src_mats, image_out, bake_type, target.prefix, suffix, output, digest, base)
+                        continue
+
+                    yield f"{target.prefix}: Baking {suffix}"
+                    if transfer is not None:
+                        images = [t[bake_type] for t in textures]
+                        pixels = transfer.transfer(corr, bake_type, images)
+                        is_linear = any(img is not None and img.is_float for img in images)
+                    else:
+                        for src_mat, src_nodes in src_mats:
+                            link_source_map(src_mat, src_nodes, bake_type)
+                        clear_pixels(image_out)
+                        with bpy.context.temp_override(selected_objects=[*srcs, dst], active_object=dst):
+                            bake(settings, bake_type, self.rays, self.cage)
+                        pixels = pull_pixels(image_out)
+                        is_linear = image_out.is_float
+                    mask = coverage(pixels)
+
+                    if self.uses_occlusion(bake_type):
+                        yield f"{target.prefix}: Baking {suffix} occlusion"
+                        self.bake_occlusion(srcs, dst)
+                        pixels = pack_occlusion(pixels, is_linear, pull_pixels(image_out), image_out.is_float)
+
+                    yield f"{target.prefix}: Saving {suffix}"
+                    if region is not None:
+                        pixels, mask = merge_region(read_output(output, output_format(settings, bake_type)[0], bake_type, is_linear),
+                                                    pixels, mask, region)
+                    # Islands are padded by us rather than by Cycles, the bake itself has no margin
+                    if self.preview:
+                        self.previews[bake_type] = (pad(pixels, mask, map_padding(settings, bake_type)), is_linear)
+                        continue
+                    self.save_outputs(output, digest, {"base": base, "geometry": geometry}, pixels, mask, bake_type, is_linear, derived)
+                    del pixels, mask
+
+                # Free this target before moving on to the next one
+                self.objs.remove(dst)
+                self.mats.remove(dst_mat)
+                self.images.remove(image_out)
+                if self.cage is not None:
+                    self.objs.remove(self.cage)
+                    release(self.cage)
+                    self.cage = None
+                cleanup([dst], None, dst_mat)
+                bpy.data.images.remove(image_out)
+                self.record_writes(manifest, False)
+                if snapshot is not None:
+                    save_snapshot(snapshot_path, snapshot)
+
+            yield "Finishing writes"
+            self.record_writes(manifest, True)
+        finally:
+            self.cleanup()
+
+    def run(self):
+        # The stages with their time and memory recorded, logged once the job ends for any reason
+        steps = self.steps()
+        if self.preview:
+            # Previews leave the stats of the last full bake alone
+            yield from steps
+            return
+
+        status = "cancelled"
+        stats.begin(trace=self.settings.use_stats_log)
         try:
-            ctx['modifier'] = m
-            bpy.ops.object.modifier_apply(ctx, modifier=m.name)
-        except RuntimeError:
-            print(f"Error applying {m.name} to {obj.name}, removing it instead.")
-            obj.modifiers.remove(m)
+            for stage in steps:
+                stats.stage(stage)
+                yield stage
+            status = "finished"
+        except Exception as e:
+            status = f"failed: {e}"
+            raise
+        finally:
+            steps.close()
+            stats.end(status)
+            if self.settings.use_stats_log:
+                stats.log(bpy.path.abspath(self.settings.output_folder), self.log_info())
+
+    def log_info(self) -> dict:
+        settings = self.settings
+        return {
+            "blend": bpy.data.filepath,
+            "source": [obj.name for obj in self.sources],
+            "engine": settings.bake_engine,
+            "maps": [suffix for _, _, suffix in self.maps],
+            "targets": [{"prefix": t.prefix, "width": t.width, "height": t.height} for t in self.targets],
+            "skipped_stages": self.skipped,
+        }
+
+    def bake_tiled(self, tiles: TiledBake, srcs: list[Object], dst: Object, src_mats: list, image_out: Image,
+                   bake_type: str, prefix: str, suffix: str, output: str, digest: str, base: str):
+        # Finished tiles go to a disk backed buffer next to the output, so memory depends on the tile size only
+        buffer_path = output + ".part"
+        shape = (tiles.height, tiles.width, 4)
+        self.files.append(buffer_path)
+        buffer = np.memmap(buffer_path, dtype=np.uint8, mode="w+", shape=shape)
+
+        for src_mat, src_nodes in src_mats:
+            link_source_map(src_mat, src_nodes, bake_type)
+
+        for i, tile in enumerate(tiles.tiles):
+            yield f"{prefix}: Baking {suffix} tile {i + 1}/{len(tiles.tiles)}"
+            tiles.set_tile(tile)
+            clear_pixels(image_out)
+            with bpy.context.temp_override(selected_objects=[*srcs, dst], active_object=dst):
+                bake(self.settings, bake_type, self.rays, self.cage)
+            pixels = pull_pixels(image_out)
+            mask = coverage(pixels)
+
+            if self.uses_occlusion(bake_type):
+                yield f"{prefix}: Baking {suffix} occlusion tile {i + 1}/{len(tiles.tiles)}"
+                self.bake_occlusion(srcs, dst)
+                pixels = pack_occlusion(pixels, image_out.is_float, pull_pixels(image_out), image_out.is_float)
+            # The tile border holds the neighbouring texels, so padding is seamless across tiles
+            tiles.store(buffer, tile, pad(pixels, mask, map_padding(self.settings, bake_type)))
+
+        yield f"{prefix}: Saving {suffix}"
+        buffer.flush()
+        del buffer
+        future = self.writer.submit_buffer(output, buffer_path, shape, output_format(self.settings, bake_type)[1])
+        # Padded tile by tile, there is no coverage of the whole output to pad it again from
+        self.writes.append((future, output, digest, {"base": base, "padding": map_padding(self.settings, bake_type)}))
+
+    def save_outputs(self, output: str, digest: str, info: dict, pixels: np.ndarray, mask: np.ndarray,
+                     bake_type: str, is_linear: bool, derived: list) -> None:
+        # Padding and encoding overlap with baking the next map.
+        # The coverage is kept next to the output, so a new padding can be applied without baking again.
+        settings = self.settings
+        fmt, level, block_format = output_format(settings, bake_type)
+        padding = map_padding(settings, bake_type)
+        # Block compression is lossy, those outputs are always baked again
+        keep = fmt != 'DDS'
+        padded = self.writer.submit_pad(pixels, mask, padding, coverage_path(output) if keep else "")
+        future = self.writer.submit(output, padded, fmt, level, block_format, bake_type, is_linear)
+        self.writes.append((future, output, digest, {**info, "padding": padding, "coverage": keep, "linear": is_linear}))
+        # Filtered and padded at their own size on the writer threads too, the padded pixels are only read
+        for lod, lod_output, lod_digest in derived:
+            future = self.writer.submit_resized(lod_output, padded, mask, padding, lod.width, lod.height,
+                                                settings.derive_filter, fmt, level, block_format, bake_type, is_linear)
+            self.writes.append((future, lod_output, lod_digest, {"padding": padding}))
+
+    def bake_occlusion(self, srcs: list[Object], dst: Object) -> None:
+        # Occlusion needs far more samples than a texture transfer
+        samples = min(self.settings.ao_samples, PREVIEW_AO_SAMPLES) if self.preview else self.settings.ao_samples
+        # Occlusion sees the whole scene, the originals sit right on top of the bake copies and would block every ray
+        bake_objs = [*srcs, dst] + ([self.cage] if self.cage is not None else [])
+        with self.profile.override(bpy.context.scene.cycles, "samples", samples), self.profile.only_render(bake_objs):
+            with bpy.context.temp_override(selected_objects=[*srcs, dst], active_object=dst):
+                bake(self.settings, 'AO', self.rays, self.cage)
+
+    def record_writes(self, manifest: BakeManifest, wait: bool) -> None:
+        # Write errors surface here, on the main thread
+        remaining = []
+        for write in self.writes:
+            if wait or write[0].done():
+                write[0].result()
+                manifest.record(*write[1:])
+            else:
+                remaining.append(write)
+        self.writes = remaining
+
+    def cleanup(self) -> None:
+        if self.profile is not None:
+            self.profile.restore()
+            self.profile = None
+
+        if self.writer is not None:
+            self.writer.shutdown()
+            self.writer = None
+        self.writes.clear()
+
+        # Objects or images may already be gone if the user deleted them mid bake
+        objs = [o for o in self.objs if o.name in bpy.data.objects]
+        cleanup(objs, None, None)
+
+        for mat in self.mats:
+            if mat.name in bpy.data.materials:
+                bpy.data.materials.remove(mat)
+
+        for img in self.images:
+            if img.name in bpy.data.images:
+                bpy.data.images.remove(img)
+
+        for path in self.files:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+        self.objs.clear()
+        self.mats.clear()
+        self.images.clear()
+        self.files.clear()
 
-    for m in obj.modifiers:
-        obj.modifiers.remove(m)
 
 class MSFSBake_Bake(bpy.types.Operator):
     bl_idname = "msfsbake.bake"
     bl_label = "Bake selected mesh maps"
-    bl_description = "Bakes all selected mesh maps"
+    bl_description = "Bakes all selected mesh maps. Runs in the background when started from the UI, press Esc to cancel"
+
+    @classmethod
+    def poll(cls, context: Context) -> bool:
+        return not progress.running
 
     def execute(self, context: Context) -> None:
-        settings : MSFSBake_Settings = context.scene.msfs_properties
+        job = BakeJob(context.scene.msfs_properties)
+        error = job.validate()
+        if error is not None:
+            self.report({"ERROR"}, error)
+            return {"CANCELLED"}
 
-        # Basic validation
-        if settings.src_obj is None or settings.dst_obj is None:
-           self.report({"ERROR"}, "Input or target object not set")
-           return {"CANCELLED"}
-        
-        if settings.src_obj == settings.dst_obj:
-           self.report({"ERROR"}, "Input and target objects can not be the same")
-           return {"CANCELLED"}
-        
-        if (not settings.render_is_diffuse_enabled and 
-            not settings.render_is_normal_enabled and 
-            not settings.render_is_composite_enabled):
-           self.report({"ERROR"}, "No textures selected to bake")
-           return {"CANCELLED"}
-        
-        if settings.src_obj.active_material is None:
-           self.report({"ERROR"}, "Input object has no material")
-           return {"CANCELLED"}
-
-        # Get input images
-        tex_color : Image = settings.src_obj.active_material.msfs_base_color_texture
-        if tex_color is None and settings.render_is_diffuse_enabled:
-            tex_color = find_image(settings.src_obj.active_material, ["ALBD", "DIFF", "COL"])
-            
-        tex_normal : Image = settings.src_obj.active_material.msfs_normal_texture
-        if tex_normal is None and settings.render_is_normal_enabled:
-            tex_normal = find_image(settings.src_obj.active_material, ["NORM", "NRM"])
+        missing = job.missing_maps()
+        if missing:
+            self.report({"WARNING"}, "Using defaults for " + ", ".join(missing))
 
-        tex_composite : Image = settings.src_obj.active_material.msfs_occlusion_metallic_roughness_texture
-        if tex_composite is None and settings.render_is_composite_enabled:
-            tex_composite = find_image(settings.src_obj.active_material, ["COMP"])
-            
-        # Texture validation
-        if tex_color is None and settings.render_is_diffuse_enabled:
-            self.report({"ERROR"}, "No color map found on input object to bake")
+        for _ in job.run():
+            pass
+
+        return {"FINISHED"}
+
+    def invoke(self, context: Context, event) -> None:
+        job = BakeJob(context.scene.msfs_properties)
+        error = job.validate()
+        if error is not None:
+            self.report({"ERROR"}, error)
             return {"CANCELLED"}
-        
-        if tex_normal is None and settings.render_is_normal_enabled:
-            self.report({"ERROR"}, "No normal map found on input object to bake")
+
+        missing = job.missing_maps()
+        if missing:
+            self.report({"WARNING"}, "Using defaults for " + ", ".join(missing))
+
+        self._job = job
+        self._steps = job.run()
+        progress.start(job.stage_count())
+
+        wm = context.window_manager
+        wm.progress_begin(0, progress.total)
+        self._timer = wm.event_timer_add(0.01, window=context.window)
+        wm.modal_handler_add(self)
+        return {"RUNNING_MODAL"}
+
+    def modal(self, context: Context, event) -> None:
+        if event.type == 'ESC' or progress.cancel_requested:
+            self.finish(context)
+            self.report({"WARNING"}, "Bake cancelled")
             return {"CANCELLED"}
-        
-        if tex_composite is None and settings.render_is_composite_enabled:
-            self.report({"ERROR"}, "No composite map found on input object to bake")
+
+        if event.type != 'TIMER':
+            return {"PASS_THROUGH"}
+
+        # Run a single stage, then hand control back to the UI
+        try:
+            stage = next(self._steps)
+        except StopIteration:
+            self.finish(context)
+            self.report({"INFO"}, f"Bake finished in {progress.elapsed():.1f}s")
+            return {"FINISHED"}
+        except Exception as e:
+            self.finish(context)
+            self.report({"ERROR"}, f"Bake failed: {e}")
             return {"CANCELLED"}
 
+        progress.advance(stage)
+        progress.total = self._job.stage_count()
+        context.window_manager.progress_update(progress.done)
+        redraw_panels(context)
+        return {"RUNNING_MODAL"}
+
+    def finish(self, context: Context) -> None:
+        # Closing the generator runs the job cleanup
+        self._steps.close()
+        wm = context.window_manager
+        wm.event_timer_remove(self._timer)
+        wm.progress_end()
+        progress.stop()
+        redraw_panels(context)
 
 
-        # Setup high poly source object
-        src : Object = settings.src_obj.copy()
-        src.data = src.data.copy()
-        src.name = SRC_OBJ_NAME
-        src.hide_render = False
-
-        bpy.context.view_layer.layer_collection.collection.objects.link(src)
-
-        apply_modifiers(src)
-
-
-        # Setup high poly material
-        src_mat = bpy.data.materials.new(name=SRC_MATERIAL_NAME)
-        src_mat.use_nodes = True
-        src_mat.node_tree.nodes.clear()
-        src_out_node : ShaderNodeOutputMaterial = src_mat.node_tree.nodes.new("ShaderNodeOutputMaterial")
-        src_bsdf_node : ShaderNodeBsdfDiffuse = src_mat.node_tree.nodes.new("ShaderNodeBsdfDiffuse")
-        src_mat.node_tree.links.new(src_out_node.inputs['Surface'], src_bsdf_node.outputs['BSDF'])
-        src.active_material = src_mat
-
-        # Setup low poly destination object
-        dst : Object = settings.dst_obj.copy()
-        dst.data = dst.data.copy()
-        dst.name = DST_OBJ_NAME
-        dst.hide_render = False
-
-        bpy.context.view_layer.layer_collection.collection.objects.link(dst)
-
-        apply_modifiers(dst)
-    
-        # Setup low poly material
-        dst_mat = bpy.data.materials.new(name=DST_MATERIAL_NAME)
-        dst.data.materials.clear()
-        dst.data.materials.append(dst_mat)
-        dst.active_material = dst_mat
-
-        dst_mat.use_nodes = True
-        ntree_out : NodeTree = dst_mat.node_tree
-        dst_output_node : ShaderNodeTexImage = dst_mat.node_tree.nodes.new("ShaderNodeTexImage")
-        dst_output_node.image = bpy.data.images.new(DST_TEXTURE_NAME, width=settings.output_width, height=settings.output_height)
-        dst_output_node.select = True
-        ntree_out.nodes.active = dst_output_node
-
-        # Adjust position
-        if settings.obj_align:
-            dst.location = src.location
-
-        bpy.data.scenes["Scene"].render.engine = 'CYCLES'
-        image_out : Image = dst_output_node.image
-
-        objs = [src, dst]
-        with bpy.context.temp_override(selected_objects=objs, active_object=dst):
-            if settings.render_is_diffuse_enabled:
-                # Diffuse
-                src_tex_color_node : ShaderNodeTexImage = src_mat.node_tree.nodes.new("ShaderNodeTexImage")
-                src_tex_color_node.image = tex_color
-                src_mat.node_tree.links.new(src_bsdf_node.inputs['Color'], src_tex_color_node.outputs['Color'])
-
-                bake(settings, 'DIFFUSE')
-                save_image(image_out, settings.output_folder, settings.output_file_prefix, "ABLD")
-
-            if settings.render_is_normal_enabled:
-                # Normal
-                src_normal_map_node : ShaderNodeNormalMap = src_mat.node_tree.nodes.new("ShaderNodeNormalMap")
-                src_tex_normal_node : ShaderNodeTexImage = src_mat.node_tree.nodes.new("ShaderNodeTexImage")
-                src_tex_normal_node.image = tex_normal
-
-                src_mat.node_tree.links.new(src_normal_map_node.inputs['Color'], src_tex_normal_node.outputs['Color'])
-                src_mat.node_tree.links.new(src_bsdf_node.inputs['Normal'], src_normal_map_node.outputs['Normal'])
-
-                bake(settings, 'NORMAL')
-                save_image(image_out, settings.output_folder, settings.output_file_prefix, "NORM")
-
-            if settings.render_is_composite_enabled:
-                # Composite
-                src_tex_composite_node : ShaderNodeTexImage = src_mat.node_tree.nodes.new("ShaderNodeTexImage")
-                src_tex_composite_node.image = tex_composite
-                src_mat.node_tree.links.new(src_bsdf_node.inputs['Color'], src_tex_composite_node.outputs['Color'])
-                
-                bake(settings, 'COMPOSITE')
-                save_image(image_out, settings.output_folder, settings.output_file_prefix, "COMP")
-
-        cleanup(objs, src_mat, dst_mat)
-        
+class MSFSBake_Cancel(bpy.types.Operator):
+    bl_idname = "msfsbake.cancel"
+    bl_label = "Cancel bake"
+    bl_description = "Cancels the running bake after the current stage"
+
+    def execute(self, context: Context) -> None:
+        progress.cancel_requested = True
         return {"FINISHED"}
 
 
+def redraw_panels(context: Context) -> None:
+    for area in context.screen.areas:
+        if area.type == 'VIEW_3D':
+            area.tag_redraw()
+
+
+def setup_source_material(settings: MSFSBake_Settings, textures: dict[str, Image | None]) -> tuple[Material, dict]:
+    # Setup high poly material, with one texture node per enabled map this slot provides
+    src_mat = bpy.data.materials.new(name=SRC_MATERIAL_NAME)
+    src_mat.use_nodes = True
+    src_mat.node_tree.nodes.clear()
+    src_out_node : ShaderNodeOutputMaterial = src_mat.node_tree.nodes.new("ShaderNodeOutputMaterial")
+    src_bsdf_node : ShaderNodeBsdfDiffuse = src_mat.node_tree.nodes.new("ShaderNodeBsdfDiffuse")
+    src_mat.node_tree.links.new(src_out_node.inputs['Surface'], src_bsdf_node.outputs['BSDF'])
+
+    # Texture nodes are kept so their images can be swapped per target
+    nodes = {'BSDF': src_bsdf_node, 'IMAGES': {}}
+
+    if settings.render_is_diffuse_enabled and textures['DIFFUSE'] is not None:
+        src_tex_color_node : ShaderNodeTexImage = src_mat.node_tree.nodes.new("ShaderNodeTexImage")
+        src_tex_color_node.image = textures['DIFFUSE']
+        nodes['DIFFUSE'] = src_tex_color_node
+        nodes['IMAGES']['DIFFUSE'] = src_tex_color_node
+
+    if settings.render_is_normal_enabled and textures['NORMAL'] is not None:
+        src_normal_map_node : ShaderNodeNormalMap = src_mat.node_tree.nodes.new("ShaderNodeNormalMap")
+        src_tex_normal_node : ShaderNodeTexImage = src_mat.node_tree.nodes.new("ShaderNodeTexImage")
+        src_tex_normal_node.image = textures['NORMAL']
+        src_mat.node_tree.links.new(src_normal_map_node.inputs['Color'], src_tex_normal_node.outputs['Color'])
+        nodes['NORMAL'] = src_normal_map_node
+        nodes['IMAGES']['NORMAL'] = src_tex_normal_node
+
+    if settings.render_is_composite_enabled and textures['COMPOSITE'] is not None:
+        src_tex_composite_node : ShaderNodeTexImage = src_mat.node_tree.nodes.new("ShaderNodeTexImage")
+        src_tex_composite_node.image = textures['COMPOSITE']
+        nodes['COMPOSITE'] = src_tex_composite_node
+        nodes['IMAGES']['COMPOSITE'] = src_tex_composite_node
+
+    return src_mat, nodes
+
+
+def link_source_map(src_mat: Material, nodes: dict, bake_type: str) -> None:
+    # Wire the texture node for this map into the diffuse shader, replacing any previous link.
+    # Slots without the map bake the unlinked shader defaults instead.
+    bsdf = nodes['BSDF']
+    links = src_mat.node_tree.links
+    if bake_type == 'NORMAL':
+        if 'NORMAL' in nodes:
+            links.new(bsdf.inputs['Normal'], nodes['NORMAL'].outputs['Normal'])
+    else:
+        for link in list(bsdf.inputs['Color'].links):
+            links.remove(link)
+        if bake_type in nodes:
+            links.new(bsdf.inputs['Color'], nodes[bake_type].outputs['Color'])
+
+
+def setup_target(target: BakeTarget, width: int, height: int, float_buffer: bool) -> tuple[Object, Material, Image]:
+    # Setup low poly destination object, the parts of an atlas are joined into one
+    if target.parts:
+        dst = joined_object(target.parts, DST_OBJ_NAME)
+    else:
+        dst = bake_object(target.dst_obj, DST_OBJ_NAME)
+
+    # Setup low poly material
+    dst_mat = bpy.data.materials.new(name=DST_MATERIAL_NAME)
+    dst.data.materials.clear()
+    dst.data.materials.append(dst_mat)
+    dst.active_material = dst_mat
+
+    dst_mat.use_nodes = True
+    ntree_out : NodeTree = dst_mat.node_tree
+    dst_output_node : ShaderNodeTexImage = dst_mat.node_tree.nodes.new("ShaderNodeTexImage")
+    dst_output_node.image = bpy.data.images.new(DST_TEXTURE_NAME, width=width, height=height, float_buffer=float_buffer)
+    dst_output_node.select = True
+    ntree_out.nodes.active = dst_output_node
+
+    return dst, dst_mat, dst_output_node.image
+
+
 def cleanup(objs, src_mat, dst_mat):
     # Cleanup copies and extra materials
-    with bpy.context.temp_override(selected_objects=objs):
-        bpy.ops.object.delete()
+    for obj in objs:
+        release(obj)
 
     if src_mat is not None:
         bpy.data.materials.remove(src_mat)
@@ -179,14 +846,80 @@ def cleanup(objs, src_mat, dst_mat):
 
 
 
-def bake(settings: MSFSBake_Settings, bake_type : str):
+def bake(settings: MSFSBake_Settings, bake_type : str, rays: tuple[float, float], cage: Object | None):
+    # No margin, islands are padded afterwards from the texels the bake covered
+    options = dict(margin=0,
+                   use_selected_to_active=True,
+                   max_ray_distance=rays[0],
+                   cage_extrusion=rays[1],
+                   use_cage=cage is not None,
+                   cage_object=cage.name if cage is not None else "")
+
+    # Occlusion of the source geometry as seen from the target surface
+    if bake_type == 'AO':
+        bpy.ops.object.bake(type='AO', **options)
+        return
+
     bpy.ops.object.bake(type='NORMAL' if bake_type == 'NORMAL' else 'DIFFUSE',
-                        margin_type='EXTEND',
-                        margin=settings.output_padding,
-                        use_selected_to_active=True,
-                        max_ray_distance=settings.render_ray_dist,
-                        cage_extrusion=settings.render_extrusion,
-                        pass_filter={'COLOR'} if bake_type != "Normal" else None)
+                        pass_filter={'COLOR'} if bake_type != "Normal" else None,
+                        **options)
+
+
+def uv_texels(obj: Object) -> np.ndarray:
+    # Texels the active UV map of an object covers, at the check resolution
+    mesh = evaluated_mesh(obj)
+    mesh.calc_loop_triangles()
+    loops = np.empty(len(mesh.loop_triangles) * 3, dtype=np.int32)
+    mesh.loop_triangles.foreach_get("loops", loops)
+    uv = np.empty(len(mesh.loops) * 2, dtype=np.float64)
+    mesh.uv_layers.active.data.foreach_get("uv", uv)
+    return rasterize(uv.reshape(-1, 2)[loops].reshape(-1, 3, 2), ATLAS_CHECK_RES, ATLAS_CHECK_RES)[0]
+
+
+def overlapping_parts(objs: tuple[Object, ...]) -> list[tuple[str, str]]:
+    # Pairs of atlas parts whose UVs cover the same texels, they would overwrite each other in one bake
+    # Each texel remembers the last part covering it, so every part is only compared once
+    owner = np.full(ATLAS_CHECK_RES * ATLAS_CHECK_RES, -1, dtype=np.int32)
+    counts = []
+    pairs = []
+    for i, obj in enumerate(objs):
+        texel = uv_texels(obj)
+        counts.append(len(texel))
+
+        previous = owner[texel]
+        shared = np.bincount(previous[previous >= 0], minlength=i)
+        for j in np.nonzero(shared)[0]:
+            if shared[j] > ATLAS_OVERLAP_TOLERANCE * min(counts[i], counts[j]):
+                pairs.append((objs[j].name, obj.name))
+        owner[texel] = i
+    return pairs
+
+
+def shares_layout(lod: Object, parent: Object) -> bool:
+    # Whether the UVs of a derived LOD land on texels its parent was baked to
+    covered = np.zeros(ATLAS_CHECK_RES * ATLAS_CHECK_RES, dtype=bool)
+    covered[uv_texels(parent)] = True
+    texel = uv_texels(lod)
+    outside = np.count_nonzero(~covered[texel])
+    return len(texel) > 0 and outside <= DERIVED_LAYOUT_TOLERANCE * len(texel)
+
+
+# MSFS material property and name suffixes to fall back on for each map
+TEXTURE_LOOKUP = {
+    'DIFFUSE': ("msfs_base_color_texture", ["ALBD", "DIFF", "COL"]),
+    'NORMAL': ("msfs_normal_texture", ["NORM", "NRM"]),
+    'COMPOSITE': ("msfs_occlusion_metallic_roughness_texture", ["COMP"]),
+}
+
+
+def resolve_textures(mat: Material | None) -> dict[str, Image | None]:
+    textures = {}
+    for bake_type, (prop, search_suffix) in TEXTURE_LOOKUP.items():
+        tex : Image = getattr(mat, prop, None)
+        if tex is None:
+            tex = find_image(mat, search_suffix)
+        textures[bake_type] = tex
+    return textures
 
 
 def find_image(src_mat: Material, search_suffix : list[str]) -> Image | None:
@@ -194,14 +927,27 @@ def find_image(src_mat: Material, search_suffix : list[str]) -> Image | None:
         regex_name = re.compile(r"^.*_(" + "|".join(search_suffix) + r")$", re.IGNORECASE)          
         regex_file = re.compile(r"^.*_(" + "|".join(search_suffix) + r").*\.(PNG|DDS)$", re.IGNORECASE)            
         for node in src_mat.node_tree.nodes:
-            if isinstance(node, ShaderNodeTexImage):
+            if isinstance(node, ShaderNodeTexImage) and node.image is not None:
                 if regex_file.match(node.image.filepath) or regex_name.match(node.image.name):
                     return node.image
             
     return None
 
 
-def save_image(img: Image, folder: str, filename: str, suffix: str) -> None:
-    img.filepath_raw = f'{folder}\\{filename}_{suffix}.png'
-    img.file_format = 'PNG'
-    img.save()
+def output_format(settings: MSFSBake_Settings, bake_type: str) -> tuple[str, int, str]:
+    # File format, compression level and DDS block format of a map
+    name = OUTPUT_SETTINGS[bake_type]
+    return (getattr(settings, f"output_format_{name}"),
+            getattr(settings, f"output_compression_{name}"),
+            getattr(settings, f"output_dds_{name}"))
+
+
+def map_padding(settings: MSFSBake_Settings, bake_type: str) -> int:
+    # Every map follows the shared padding unless padding is set per map
+    if settings.use_map_padding:
+        return getattr(settings, f"output_padding_{OUTPUT_SETTINGS[bake_type]}")
+    return settings.output_padding
+
+
+def output_path(folder: str, filename: str) -> str:
+    return os.path.join(bpy.path.abspath(folder), filename)
@@ -0,0 +1,253 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Headless batch baking from a JSON or TOML manifest.
+#
+# Driver, spreads the manifest over a pool of background Blender processes:
+#   blender -b -P render_msfs_bake/Batch.py -- manifest.json --jobs 4 --results results.json
+#   python render_msfs_bake/Batch.py manifest.json --blender /path/to/blender
+#
+# Each job entry gives a "blend" file plus any MSFSBake_Settings property by name.
+# Objects, a "src_collection" and an atlas "dst_collection" are referenced by name, and "maps" is a shortcut for the enable flags:
+#   {"defaults": {"output_width": 2048, "output_padding": 4},
+#    "jobs": [{"blend": "wing.blend", "src_obj": "Wing_High", "dst_obj": "Wing_LOD0",
+#              "maps": ["color", "normal"], "output_folder": "out/wing",
+#              "lod_targets": [{"dst_obj": "Wing_LOD1", "output_width": 1024, "output_height": 1024}]}]}
+
+MAP_FLAGS = {
+    "color": "render_is_diffuse_enabled",
+    "normal": "render_is_normal_enabled",
+    "composite": "render_is_composite_enabled",
+}
+
+OBJECT_FIELDS = ("src_obj", "dst_obj")
+COLLECTION_FIELDS = {"src_collection": "use_src_collection", "dst_collection": "use_dst_collection"}
+PATH_FIELDS = ("blend", "output_folder")
+
+
+def load_manifest(path: str) -> list[dict]:
+    if path.lower().endswith(".toml"):
+        try:
+            import tomllib
+        except ImportError:
+            raise SystemExit("TOML manifests need Python 3.11 or newer, use JSON instead")
+        with open(path, "rb") as f:
+            manifest = tomllib.load(f)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+    # Paths in the manifest are relative to the manifest itself
+    base = os.path.dirname(os.path.abspath(path))
+    defaults = manifest.get("defaults", {})
+    jobs = []
+    for entry in manifest.get("jobs", []):
+        job = {**defaults, **entry}
+        for field in PATH_FIELDS:
+            if field in job:
+                job[field] = os.path.normpath(os.path.join(base, job[field]))
+        if "blend" not in job:
+            raise SystemExit(f"Manifest job {len(jobs)} has no blend file")
+        jobs.append(job)
+    return jobs
+
+
+def run_job(blender: str, index: int, job: dict, threads: int, timeout: float | None) -> dict:
+    result = {
+        "index": index,
+        "blend": job["blend"],
+        "src_obj": job.get("src_obj"),
+        "dst_obj": job.get("dst_obj"),
+        "status": "failed",
+        "error": None,
+    }
+
+    with tempfile.TemporaryDirectory(prefix="msfsbake_") as tmp:
+        job_path = os.path.join(tmp, "job.json")
+        result_path = os.path.join(tmp, "result.json")
+        with open(job_path, "w", encoding="utf-8") as f:
+            json.dump(job, f)
+
+        cmd = [blender, "-b", job["blend"], "-noaudio"]
+        if threads > 0:
+            cmd += ["-t", str(threads)]
+        cmd += ["-P", os.path.abspath(__file__), "--", "--worker", job_path, "--worker-result", result_path]
+
+        start = time.perf_counter()
+        try:
+            proc = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            result["time"] = time.perf_counter() - start
+            result["error"] = f"Timed out after {timeout}s"
+            return result
+        result["time"] = time.perf_counter() - start
+        result["returncode"] = proc.returncode
+
+        if os.path.exists(result_path):
+            with open(result_path, "r", encoding="utf-8") as f:
+                result.update(json.load(f))
+        else:
+            # Blender died before the worker could report anything
+            result["error"] = (proc.stderr or proc.stdout)[-2000:] or f"Blender exited with code {proc.returncode}"
+
+    return result
+
+
+def run_driver(args: argparse.Namespace) -> int:
+    jobs = load_manifest(args.manifest)
+    blender = args.blender or os.environ.get("BLENDER") or blender_binary() or "blender"
+    threads = args.threads if args.threads is not None else max(1, (os.cpu_count() or 1) // args.jobs)
+
+    print(f"MSFS Bake: {len(jobs)} jobs on {args.jobs} workers")
+    start = time.perf_counter()
+    results = []
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        futures = [pool.submit(run_job, blender, i, job, threads, args.timeout) for i, job in enumerate(jobs)]
+        for future in futures:
+            result = future.result()
+            results.append(result)
+            print(f"[{result['index']}] {result['status']} {result['blend']} ({result['time']:.1f}s)"
+                  + (f": {result['error']}" if result["error"] else ""))
+
+    failed = sum(1 for r in results if r["status"] != "ok")
+    summary = {
+        "manifest": os.path.abspath(args.manifest),
+        "workers": args.jobs,
+        "total": len(results),
+        "succeeded": len(results) - failed,
+        "failed": failed,
+        "time": time.perf_counter() - start,
+        "results": results,
+    }
+
+    results_path = args.results or os.path.splitext(args.manifest)[0] + "_results.json"
+    with open(results_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    print(f"MSFS Bake: {summary['succeeded']}/{summary['total']} succeeded, results in {results_path}")
+
+    return 1 if failed else 0
+
+
+def blender_binary() -> str | None:
+    try:
+        import bpy
+    except ImportError:
+        return None
+    return bpy.app.binary_path or None
+
+
+def apply_job(settings, job: dict) -> None:
+    import bpy
+
+    def get_object(name: str):
+        obj = bpy.data.objects.get(name)
+        if obj is None:
+            raise ValueError(f"Object '{name}' not found in {bpy.data.filepath}")
+        return obj
+
+    # Objects first, since picking the destination resets the file prefix
+    for field in OBJECT_FIELDS:
+        if job.get(field):
+            setattr(settings, field, get_object(job[field]))
+
+    for field, flag in COLLECTION_FIELDS.items():
+        if job.get(field):
+            collection = bpy.data.collections.get(job[field])
+            if collection is None:
+                raise ValueError(f"Collection '{job[field]}' not found in {bpy.data.filepath}")
+            setattr(settings, field, collection)
+            setattr(settings, flag, job.get(flag, True))
+
+    # Explicit heights should not be overwritten by linked width updates
+    if "output_height" in job:
+        settings.output_are_dimensions_linked = False
+
+    if "maps" in job:
+        unknown = set(job["maps"]) - set(MAP_FLAGS)
+        if unknown:
+            raise ValueError(f"Unknown maps {sorted(unknown)}, expected {sorted(MAP_FLAGS)}")
+        for name, flag in MAP_FLAGS.items():
+            setattr(settings, flag, name in job["maps"])
+
+    if "lod_targets" in job:
+        settings.lod_targets.clear()
+        for entry in job["lod_targets"]:
+            lod = settings.lod_targets.add()
+            lod.dst_obj = get_object(entry["dst_obj"])
+            for key, value in entry.items():
+                if key != "dst_obj":
+                    setattr(lod, key, value)
+        settings.use_lod_queue = job.get("use_lod_queue", True)
+
+    skip = set(OBJECT_FIELDS) | set(COLLECTION_FIELDS) | set(COLLECTION_FIELDS.values()) | {"blend", "maps", "lod_targets", "use_lod_queue"}
+    for key, value in job.items():
+        if key in skip:
+            continue
+        if key not in settings.bl_rna.properties:
+            raise ValueError(f"Unknown setting '{key}'")
+        setattr(settings, key, value)
+
+
+def run_worker(args: argparse.Namespace) -> int:
+    import bpy
+
+    # Make the add-on available even when it is not installed in this Blender
+    if not hasattr(bpy.types.Scene, "msfs_properties"):
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        import render_msfs_bake
+        render_msfs_bake.register()
+
+    with open(args.worker, "r", encoding="utf-8") as f:
+        job = json.load(f)
+
+    result = {"status": "failed", "error": None}
+    start = time.perf_counter()
+    try:
+        settings = bpy.context.scene.msfs_properties
+        apply_job(settings, job)
+        # A folder set in the .blend may be relative to it
+        os.makedirs(bpy.path.abspath(settings.output_folder), exist_ok=True)
+        if bpy.ops.msfsbake.bake() == {"FINISHED"}:
+            result["status"] = "ok"
+        else:
+            result["error"] = "Bake was cancelled, check the settings for this job"
+    except Exception as e:
+        result["error"] = str(e)
+    result["bake_time"] = time.perf_counter() - start
+
+    with open(args.worker_result, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+
+    return 0 if result["status"] == "ok" else 1
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(prog="Batch.py", description="Bake MSFS textures from a manifest")
+    parser.add_argument("manifest", nargs="?", help="JSON or TOML manifest of bake jobs")
+    parser.add_argument("--jobs", "-j", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="Number of Blender processes to run at once")
+    parser.add_argument("--threads", type=int, default=None, help="Render threads per Blender process, defaults to cores / jobs")
+    parser.add_argument("--timeout", type=float, default=None, help="Seconds before a single job is killed")
+    parser.add_argument("--results", help="Where to write the results summary")
+    parser.add_argument("--blender", help="Blender executable used for workers")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-result", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        return run_worker(args)
+
+    if not args.manifest:
+        parser.error("a manifest is required")
+    return run_driver(args)
+
+
+if __name__ == "__main__":
+    # Blender passes script arguments after "--"
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else sys.argv[1:]
+    sys.exit(main(argv))
@@ -0,0 +1,281 @@
+import argparse
+import json
+import os
+import platform
+import re
+import sys
+import tempfile
+import time
+
+# Headless benchmark of the bake pipeline on synthetic assets.
+#
+# Runs inside Blender on the CPU, timing every stage of a bake across a matrix of
+# poly counts, resolutions, map sets and engines:
+#   blender -b --factory-startup -noaudio -P render_msfs_bake/Benchmark.py -- --results bench.json
+#   blender -b --factory-startup -noaudio -P render_msfs_bake/Benchmark.py -- --resolutions 512 1024 --baseline base.json
+#
+# Two result files can also be compared without Blender:
+#   python render_msfs_bake/Benchmark.py --compare base.json bench.json
+
+DEFAULT_POLYS = [20000, 200000]
+DEFAULT_RESOLUTIONS = [512, 1024, 2048, 4096, 8192]
+DEFAULT_MAP_SETS = ["color", "normal", "composite", "color,normal,composite"]
+
+MAP_FLAGS = {
+    "color": "render_is_diffuse_enabled",
+    "normal": "render_is_normal_enabled",
+    "composite": "render_is_composite_enabled",
+}
+
+# Low poly targets get this fraction of the high poly faces
+LOW_POLY_RATIO = 0.02
+
+# Stages faster than this are too noisy to call a regression
+MIN_DELTA = 0.05
+
+
+def stage_kind(label: str) -> str:
+    # "LOD0: Baking ABLD tile 3/4" -> "Baking ABLD"
+    label = re.sub(r"^[^:]*: ", "", label)
+    return re.sub(r" tile \d+/\d+$", "", label)
+
+
+def time_stages(steps) -> dict[str, float]:
+    # The generator names a stage before running it, so a stage lasts until the next name.
+    # The last stage also covers the job cleanup.
+    stages : dict[str, float] = {}
+    label = None
+    start = time.perf_counter()
+    for next_label in steps:
+        now = time.perf_counter()
+        if label is not None:
+            stages[stage_kind(label)] = stages.get(stage_kind(label), 0.0) + now - start
+        label, start = next_label, now
+    if label is not None:
+        stages[stage_kind(label)] = stages.get(stage_kind(label), 0.0) + time.perf_counter() - start
+    return stages
+
+
+def case_key(case: dict) -> str:
+    return f"{case['engine']}/{case['polys']}/{case['resolution']}/{'+'.join(case['maps'])}"
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list[str]:
+    # Stages and totals that got slower than the baseline by more than threshold
+    base_cases = {case_key(c): c for c in baseline.get("cases", [])}
+    regressions = []
+    for case in current.get("cases", []):
+        base = base_cases.get(case_key(case))
+        if base is None or case.get("error") or base.get("error"):
+            continue
+
+        timings = [("total", case["total"], base["total"])]
+        timings += [(k, v, base["stages"][k]) for k, v in case["stages"].items() if k in base["stages"]]
+        for name, now, before in timings:
+            if now - before > MIN_DELTA and now > before * (1.0 + threshold):
+                regressions.append(f"{case_key(case)} {name}: {before:.3f}s -> {now:.3f}s (+{(now / max(before, 1e-9) - 1.0) * 100.0:.0f}%)")
+    return regressions
+
+
+def fill_image(name: str, size: int, kind: str, non_color: bool):
+    import bpy
+    import numpy as np
+
+    y, x = np.mgrid[0:size, 0:size] / size
+    pixels = np.ones((size, size, 4), dtype=np.float32)
+    if kind == "color":
+        checker = ((x * 16).astype(int) + (y * 16).astype(int)) % 2
+        pixels[:, :, 0] = 0.2 + 0.6 * checker
+        pixels[:, :, 1] = 0.5 + 0.4 * np.sin(x * 40.0)
+        pixels[:, :, 2] = 0.5 + 0.4 * np.cos(y * 40.0)
+    elif kind == "normal":
+        pixels[:, :, 0] = 0.5 + 0.3 * np.sin(x * 60.0)
+        pixels[:, :, 1] = 0.5 + 0.3 * np.sin(y * 60.0)
+        pixels[:, :, 2] = 1.0
+    else:
+        pixels[:, :, 0] = 1.0
+        pixels[:, :, 1] = 0.3 + 0.5 * x
+        pixels[:, :, 2] = (y > 0.5).astype(np.float32)
+
+    img = bpy.data.images.new(name, width=size, height=size)
+    if non_color:
+        img.colorspace_settings.name = "Non-Color"
+    img.pixels.foreach_set(pixels.ravel())
+    img.pack()
+    return img
+
+
+def make_material(texture_size: int):
+    import bpy
+
+    # Named the way the add-on finds MSFS textures without the MSFS material properties
+    mat = bpy.data.materials.new("Bench_Material")
+    mat.use_nodes = True
+    nodes = mat.node_tree.nodes
+    for suffix, kind in (("ALBD", "color"), ("NORM", "normal"), ("COMP", "composite")):
+        node = nodes.new("ShaderNodeTexImage")
+        node.image = fill_image(f"Bench_{suffix}", texture_size, kind, kind != "color")
+    return mat
+
+
+def make_sphere(name: str, polys: int, noise: float):
+    import bpy
+    import bmesh
+    import numpy as np
+
+    segments = max(8, int((2 * polys) ** 0.5))
+    bm = bmesh.new()
+    bmesh.ops.create_uvsphere(bm, u_segments=segments, v_segments=max(4, segments // 2), radius=1.0, calc_uvs=True)
+    mesh = bpy.data.meshes.new(name)
+    bm.to_mesh(mesh)
+    bm.free()
+
+    if noise > 0.0:
+        # Surface detail for the high poly mesh to bake down
+        co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+        mesh.vertices.foreach_get("co", co)
+        co.shape = (-1, 3)
+        co *= (1.0 + noise * np.sin(co[:, 0:1] * 23.0) * np.sin(co[:, 2:3] * 17.0))
+        mesh.vertices.foreach_set("co", co.ravel())
+
+    obj = bpy.data.objects.new(name, mesh)
+    bpy.context.scene.collection.objects.link(obj)
+    return obj
+
+
+def run_case(settings, src, dst, engine: str, resolution: int, maps: list[str], repeats: int) -> dict:
+    from render_msfs_bake import MeshCache, Prefilter, Transfer
+    from render_msfs_bake.Bake import BakeJob
+
+    case = {"engine": engine, "polys": len(src.data.polygons), "resolution": resolution, "maps": maps, "error": None}
+
+    settings.src_obj = src
+    settings.dst_obj = dst
+    settings.bake_engine = engine
+    settings.output_are_dimensions_linked = False
+    settings.output_width = resolution
+    settings.output_height = resolution
+    settings.force_rebake = True
+    for name, flag in MAP_FLAGS.items():
+        setattr(settings, flag, name in maps)
+
+    # The fastest of the repeats is the least disturbed by everything else on the machine
+    best = None
+    for _ in range(repeats):
+        job = BakeJob(settings)
+        error = job.validate()
+        if error is not None:
+            case["error"] = error
+            return case
+
+        # Every run evaluates the meshes, matches texels and prefilters sources from scratch
+        MeshCache.clear()
+        Transfer.clear()
+        Prefilter.clear()
+        start = time.perf_counter()
+        stages = time_stages(job.steps())
+        total = time.perf_counter() - start
+        if best is None or total < best[0]:
+            best = (total, stages)
+
+    case["total"], case["stages"] = best
+    return case
+
+
+def run_benchmark(args: argparse.Namespace) -> int:
+    import bpy
+
+    # Time the add-on next to this script, whether or not it is installed in this Blender
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import render_msfs_bake
+    if not hasattr(bpy.types.Scene, "msfs_properties"):
+        render_msfs_bake.register()
+
+    scene = bpy.context.scene
+    scene.cycles.device = 'CPU'
+
+    settings = scene.msfs_properties
+    settings.bake_profile = 'CUSTOM'
+    settings.profile_samples = args.samples
+    material = make_material(args.texture_size)
+
+    results = {
+        "blender": bpy.app.version_string,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "texture_size": args.texture_size,
+        "samples": args.samples,
+        "cases": [],
+    }
+
+    with tempfile.TemporaryDirectory(prefix="msfsbake_bench_") as tmp:
+        settings.output_folder = tmp
+        for polys in args.polys:
+            src = make_sphere(f"Bench_High_{polys}", polys, 0.02)
+            src.data.materials.append(material)
+            dst = make_sphere(f"Bench_Low_{polys}", max(64, int(polys * LOW_POLY_RATIO)), 0.0)
+            bpy.context.view_layer.update()
+
+            for engine in args.engines:
+                for resolution in args.resolutions:
+                    for map_set in args.maps:
+                        case = run_case(settings, src, dst, engine, resolution, map_set.split(","), args.repeats)
+                        results["cases"].append(case)
+                        print(f"{case_key(case)}: " + (case["error"] or f"{case['total']:.2f}s"))
+
+            for obj in (src, dst):
+                mesh = obj.data
+                bpy.data.objects.remove(obj)
+                bpy.data.meshes.remove(mesh)
+
+    with open(args.results, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"MSFS Bake benchmark: {len(results['cases'])} cases, results in {args.results}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            return report(compare(results, json.load(f), args.threshold))
+    return 0
+
+
+def report(regressions: list[str]) -> int:
+    for line in regressions:
+        print(f"Regression: {line}")
+    print(f"MSFS Bake benchmark: {len(regressions)} regressions")
+    return 1 if regressions else 0
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(prog="Benchmark.py", description="Time the MSFS bake pipeline on synthetic assets")
+    parser.add_argument("--results", default="msfsbake_benchmark.json", help="Where to write the timings")
+    parser.add_argument("--baseline", help="Earlier results to check the new timings against")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"), help="Compare two result files, no Blender needed")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Slowdown, as a fraction, reported as a regression")
+    parser.add_argument("--polys", type=int, nargs="+", default=DEFAULT_POLYS, help="High poly face counts")
+    parser.add_argument("--resolutions", type=int, nargs="+", default=DEFAULT_RESOLUTIONS, help="Output resolutions")
+    parser.add_argument("--maps", nargs="+", default=DEFAULT_MAP_SETS, help="Comma separated map sets, from color, normal and composite")
+    parser.add_argument("--engines", nargs="+", default=["CYCLES"], choices=["CYCLES", "TRANSFER"], help="Bake engines to time")
+    parser.add_argument("--texture-size", type=int, default=2048, help="Size of the synthetic source textures")
+    parser.add_argument("--samples", type=int, default=1, help="Cycles samples per bake")
+    parser.add_argument("--repeats", type=int, default=1, help="Runs per case, the fastest is kept")
+    args = parser.parse_args(argv)
+
+    for map_set in args.maps:
+        unknown = set(map_set.split(",")) - set(MAP_FLAGS)
+        if unknown:
+            parser.error(f"unknown maps {sorted(unknown)}, expected {sorted(MAP_FLAGS)}")
+
+    if args.compare:
+        with open(args.compare[0], "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        with open(args.compare[1], "r", encoding="utf-8") as f:
+            current = json.load(f)
+        return report(compare(current, baseline, args.threshold))
+
+    return run_benchmark(args)
+
+
+if __name__ == "__main__":
+    # Blender passes script arguments after "--"
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else sys.argv[1:]
+    sys.exit(main(argv))
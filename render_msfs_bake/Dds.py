@@ -0,0 +1,220 @@
+import struct
+import numpy as np
+from . Resample import resize
+
+# Blocks encoded per step, bounds temporary memory on large outputs
+BLOCK_CHUNK = 1 << 16
+
+BLOCK_FORMAT_ITEMS = [
+    ('BC1', "BC1", "RGB, 4 bits per texel"),
+    ('BC3', "BC3", "RGBA, 8 bits per texel"),
+    ('BC5', "BC5", "Two channels (normal X/Y), 8 bits per texel"),
+    ('BC7', "BC7", "High quality RGBA, 8 bits per texel"),
+]
+
+BLOCK_BYTES = {'BC1': 8, 'BC3': 16, 'BC5': 16, 'BC7': 16}
+
+# Legacy FourCC where readers expect it, the DX10 header otherwise
+FOURCC = {'BC1': b"DXT1", 'BC3': b"DXT5", 'BC5': b"DX10", 'BC7': b"DX10"}
+DXGI_FORMAT = {'BC5': 83, 'BC7': 98}
+
+BC7_WEIGHTS = np.array([0, 4, 9, 13, 17, 21, 26, 30, 34, 38, 43, 47, 51, 55, 60, 64], dtype=np.int32)
+
+
+def to_blocks(pixels: np.ndarray) -> tuple[np.ndarray, int, int]:
+    # (h, w, c) top row first -> (n, 16, c) blocks in row major block order, edges padded by repeating
+    height, width, channels = pixels.shape
+    bh, bw = -(-height // 4), -(-width // 4)
+    padded = np.pad(pixels, ((0, bh * 4 - height), (0, bw * 4 - width), (0, 0)), mode="edge")
+    blocks = padded.reshape(bh, 4, bw, 4, channels).transpose(0, 2, 1, 3, 4).reshape(bh * bw, 16, channels)
+    return blocks, bw, bh
+
+
+def principal_endpoints(blocks: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # End points along the main axis of each block's colors, (n, 16, c) -> two (n, c)
+    mean = blocks.mean(axis=1, keepdims=True)
+    centered = blocks - mean
+    cov = np.einsum("nki,nkj->nij", centered, centered)
+
+    # A few power iterations are plenty for 16 texels
+    axis = np.ones((len(blocks), blocks.shape[2]), dtype=np.float32)
+    for _ in range(4):
+        axis = np.einsum("nij,nj->ni", cov, axis)
+        axis /= np.maximum(np.abs(axis).max(axis=1, keepdims=True), 1e-12)
+
+    proj = np.einsum("nki,ni->nk", centered, axis)
+    length = np.maximum(np.einsum("ni,ni->n", axis, axis), 1e-12)
+    lo = mean[:, 0] + axis * (proj.min(axis=1) / length)[:, None]
+    hi = mean[:, 0] + axis * (proj.max(axis=1) / length)[:, None]
+    return np.clip(lo, 0, 255), np.clip(hi, 0, 255)
+
+
+def nearest_index(blocks: np.ndarray, palette: np.ndarray) -> np.ndarray:
+    # (n, 16, c) and (n, k, c) -> (n, 16) index of the closest palette entry
+    dist = ((blocks[:, :, None, :] - palette[:, None, :, :]) ** 2).sum(axis=3)
+    return dist.argmin(axis=2)
+
+
+def pack_indices(indices: np.ndarray, bits: int) -> np.ndarray:
+    shifts = np.arange(indices.shape[1], dtype=np.uint64) * np.uint64(bits)
+    return (indices.astype(np.uint64) << shifts).sum(axis=1, dtype=np.uint64)
+
+
+def encode_bc1(blocks: np.ndarray) -> np.ndarray:
+    rgb = blocks[:, :, :3].astype(np.float32)
+    lo, hi = principal_endpoints(rgb)
+
+    def to565(c: np.ndarray) -> np.ndarray:
+        c = np.rint(c).astype(np.int32)
+        return ((c[:, 0] * 31 + 127) // 255 << 11) | ((c[:, 1] * 63 + 127) // 255 << 5) | ((c[:, 2] * 31 + 127) // 255)
+
+    def from565(v: np.ndarray) -> np.ndarray:
+        r = (v >> 11) & 31
+        g = (v >> 5) & 63
+        b = v & 31
+        return np.stack([(r << 3) | (r >> 2), (g << 2) | (g >> 4), (b << 3) | (b >> 2)], axis=1).astype(np.float32)
+
+    # color0 > color1 selects the four color mode
+    c0 = to565(hi)
+    c1 = to565(lo)
+    swap = c0 < c1
+    c0, c1 = np.where(swap, c1, c0), np.where(swap, c0, c1)
+
+    e0 = from565(c0)
+    e1 = from565(c1)
+    palette = np.stack([e0, e1, (2 * e0 + e1) / 3, (e0 + 2 * e1) / 3], axis=1)
+    indices = nearest_index(rgb, palette)
+    indices[c0 == c1] = 0
+
+    out = np.zeros(len(blocks), dtype=[("c0", "<u2"), ("c1", "<u2"), ("idx", "<u4")])
+    out["c0"] = c0
+    out["c1"] = c1
+    out["idx"] = pack_indices(indices, 2)
+    return out.view(np.uint8).reshape(len(blocks), 8)
+
+
+def encode_bc4(values: np.ndarray) -> np.ndarray:
+    # (n, 16) single channel in 0-255 -> (n, 8) bytes, eight value mode
+    values = values.astype(np.float32)
+    a0 = np.rint(values.max(axis=1)).astype(np.int32)
+    a1 = np.rint(values.min(axis=1)).astype(np.int32)
+
+    weights = np.array([0, 7, 1, 2, 3, 4, 5, 6], dtype=np.float32)[None, :]
+    palette = ((7 - weights) * a0[:, None] + weights * a1[:, None]) / 7
+    indices = np.abs(values[:, :, None] - palette[:, None, :]).argmin(axis=2)
+    indices[a0 == a1] = 0
+
+    bits = pack_indices(indices, 3)
+    out = np.zeros((len(values), 8), dtype=np.uint8)
+    out[:, 0] = a0
+    out[:, 1] = a1
+    for i in range(6):
+        out[:, 2 + i] = (bits >> np.uint64(8 * i)) & np.uint64(0xFF)
+    return out
+
+
+def encode_bc3(blocks: np.ndarray) -> np.ndarray:
+    return np.concatenate([encode_bc4(blocks[:, :, 3]), encode_bc1(blocks)], axis=1)
+
+
+def encode_bc5(blocks: np.ndarray) -> np.ndarray:
+    return np.concatenate([encode_bc4(blocks[:, :, 0]), encode_bc4(blocks[:, :, 1])], axis=1)
+
+
+def encode_bc7(blocks: np.ndarray) -> np.ndarray:
+    # Mode 6 only: one subset, 7 bit RGBA end points with a p-bit each, 4 bit indices
+    rgba = blocks.astype(np.float32)
+    lo, hi = principal_endpoints(rgba)
+
+    def quantize(e: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # Pick the p-bit that reproduces the end point best
+        best = None
+        for p in (0, 1):
+            q = np.clip(np.rint((e - p) / 2), 0, 127).astype(np.int32)
+            err = (((q << 1) | p) - e) ** 2
+            err = err.sum(axis=1)
+            if best is None:
+                best = (q, np.full(len(e), p, dtype=np.int32), err)
+            else:
+                better = err < best[2]
+                best = (np.where(better[:, None], q, best[0]), np.where(better, p, best[1]), np.minimum(err, best[2]))
+        return best[0], best[1]
+
+    q0, p0 = quantize(lo)
+    q1, p1 = quantize(hi)
+    e0 = ((q0 << 1) | p0[:, None]).astype(np.int32)
+    e1 = ((q1 << 1) | p1[:, None]).astype(np.int32)
+
+    w = BC7_WEIGHTS[None, :, None]
+    palette = ((64 - w) * e0[:, None, :] + w * e1[:, None, :] + 32) >> 6
+    indices = nearest_index(rgba, palette.astype(np.float32))
+
+    # The first index is stored without its top bit, swap the end points where it would be set
+    flip = indices[:, 0] >= 8
+    q0, q1 = np.where(flip[:, None], q1, q0), np.where(flip[:, None], q0, q1)
+    p0, p1 = np.where(flip, p1, p0), np.where(flip, p0, p1)
+    indices[flip] = 15 - indices[flip]
+
+    u = np.uint64
+    lo_bits = np.full(len(blocks), 1 << 6, dtype=np.uint64)
+    for channel in range(4):
+        lo_bits |= q0[:, channel].astype(np.uint64) << u(7 + 14 * channel)
+        lo_bits |= q1[:, channel].astype(np.uint64) << u(14 + 14 * channel)
+    lo_bits |= p0.astype(np.uint64) << u(63)
+
+    hi_bits = p1.astype(np.uint64)
+    hi_bits |= indices[:, 0].astype(np.uint64) << u(1)
+    hi_bits |= pack_indices(indices[:, 1:], 4) << u(4)
+
+    out = np.empty((len(blocks), 2), dtype="<u8")
+    out[:, 0] = lo_bits
+    out[:, 1] = hi_bits
+    return out.view(np.uint8).reshape(len(blocks), 16)
+
+
+ENCODERS = {'BC1': encode_bc1, 'BC3': encode_bc3, 'BC5': encode_bc5, 'BC7': encode_bc7}
+
+
+def compress(pixels: np.ndarray, block_format: str) -> bytes:
+    # (h, w, 4) uint8, top row first
+    blocks, _, _ = to_blocks(pixels)
+    encoder = ENCODERS[block_format]
+    parts = [encoder(blocks[i:i + BLOCK_CHUNK]) for i in range(0, len(blocks), BLOCK_CHUNK)]
+    return b"".join(p.tobytes() for p in parts)
+
+
+def mip_chain(pixels: np.ndarray, bake_type: str) -> list[np.ndarray]:
+    # Each level halves the one above it, rounding down to one texel
+    chain = [pixels]
+    while max(chain[-1].shape[:2]) > 1:
+        height, width = chain[-1].shape[:2]
+        chain.append(resize(chain[-1], max(width // 2, 1), max(height // 2, 1), bake_type, False))
+    return chain
+
+
+def header(width: int, height: int, mips: int, block_format: str) -> bytes:
+    linear_size = max(1, -(-width // 4)) * max(1, -(-height // 4)) * BLOCK_BYTES[block_format]
+
+    # CAPS | HEIGHT | WIDTH | PIXELFORMAT | MIPMAPCOUNT | LINEARSIZE
+    flags = 0x1 | 0x2 | 0x4 | 0x1000 | 0x20000 | 0x80000
+    pixel_format = struct.pack("<II4s5I", 32, 0x4, FOURCC[block_format], 0, 0, 0, 0, 0)
+    # TEXTURE | COMPLEX | MIPMAP
+    caps = 0x1000 | 0x8 | 0x400000
+
+    data = b"DDS " + struct.pack("<7I", 124, flags, height, width, linear_size, 0, mips)
+    data += b"\0" * 44 + pixel_format + struct.pack("<4I", caps, 0, 0, 0) + b"\0" * 4
+    if FOURCC[block_format] == b"DX10":
+        # Texture2D, one array element
+        data += struct.pack("<5I", DXGI_FORMAT[block_format], 3, 0, 1, 0)
+    return data
+
+
+def write_dds(path: str, pixels: np.ndarray, block_format: str, bake_type: str) -> None:
+    # (h, w, 4) floats in 0-1, stored bottom row first like Blender images, with the full mip chain
+    height, width = pixels.shape[:2]
+    chain = mip_chain(pixels[::-1].astype(np.float32), bake_type)
+
+    with open(path, "wb") as f:
+        f.write(header(width, height, len(chain), block_format))
+        for level in chain:
+            f.write(compress(np.clip(level * 255.0 + 0.5, 0, 255).astype(np.uint8), block_format))
@@ -0,0 +1,146 @@
+import bpy
+import numpy as np
+from typing import NamedTuple
+from bpy.types import Context, Object
+from mathutils.bvhtree import BVHTree
+from . MeshCache import bake_object, joined_object, release
+from . Settings import source_objects, target_objects
+
+CAGE_OBJ_NAME = "MSFSBake_Cage"
+
+# Source vertices measured per estimate, a random subset beyond this
+MAX_SAMPLES = 250000
+
+# Headroom on top of the measured deviation, relative and in units of the target size
+MARGIN = 1.1
+MIN_OFFSET = 1e-4
+
+
+class Distances(NamedTuple):
+    ray_dist: float
+    extrusion: float
+    # Outward offset of every target vertex, for a per-vertex cage
+    vertex_extrusion: np.ndarray
+
+
+def world_mesh(obj: Object) -> tuple[np.ndarray, np.ndarray]:
+    # World space vertex positions and triangles
+    mesh = obj.data
+    mesh.calc_loop_triangles()
+
+    co = np.empty(len(mesh.vertices) * 3, dtype=np.float64)
+    mesh.vertices.foreach_get("co", co)
+    tris = np.empty(len(mesh.loop_triangles) * 3, dtype=np.int32)
+    mesh.loop_triangles.foreach_get("vertices", tris)
+
+    matrix = np.array(obj.matrix_world, dtype=np.float64)
+    return co.reshape(-1, 3) @ matrix[:3, :3].T + matrix[:3, 3], tris.reshape(-1, 3)
+
+
+def estimate(srcs: list[Object], dst: Object) -> Distances:
+    # Signed distance of the source surface from the target surface along the target normals.
+    # Extrusion has to clear everything outside the target, the rays have to reach everything inside it.
+    src_co = np.concatenate([world_mesh(src)[0] for src in srcs])
+    dst_co, dst_tris = world_mesh(dst)
+
+    points = src_co
+    if len(points) > MAX_SAMPLES:
+        points = points[np.random.default_rng(0).choice(len(points), MAX_SAMPLES, replace=False)]
+
+    bvh = BVHTree.FromPolygons(dst_co.tolist(), dst_tris.tolist(), all_triangles=True)
+    nearest = np.zeros((len(points), 3), dtype=np.float64)
+    normal = np.zeros((len(points), 3), dtype=np.float64)
+    face = np.full(len(points), -1, dtype=np.int64)
+    find_nearest = bvh.find_nearest
+    for i, point in enumerate(points.tolist()):
+        loc, nor, index, _ = find_nearest(point)
+        if index is not None:
+            nearest[i] = loc
+            normal[i] = nor
+            face[i] = index
+
+    hit = face >= 0
+    offset = np.einsum("ij,ij->i", points[hit] - nearest[hit], normal[hit])
+    face = face[hit]
+
+    size = np.linalg.norm(dst_co.max(axis=0) - dst_co.min(axis=0)) if len(dst_co) else 1.0
+    floor = MIN_OFFSET * max(size, 1.0)
+    outward = max(offset.max(initial=0.0), 0.0) * MARGIN + floor
+    inward = max(-offset.min(initial=0.0), 0.0) * MARGIN + floor
+
+    # Each target vertex clears the source points that are closest to one of its faces
+    vertex_extrusion = np.zeros(len(dst_co), dtype=np.float64)
+    outside = offset > 0
+    for corner in range(3):
+        np.maximum.at(vertex_extrusion, dst_tris[face[outside], corner], offset[outside])
+
+    # Spread to the neighbours, so the cage does not pinch between a peak and the next vertex
+    edges = np.concatenate([dst_tris[:, [0, 1]], dst_tris[:, [1, 2]], dst_tris[:, [2, 0]]])
+    spread = vertex_extrusion.copy()
+    np.maximum.at(spread, edges[:, 0], vertex_extrusion[edges[:, 1]])
+    np.maximum.at(spread, edges[:, 1], vertex_extrusion[edges[:, 0]])
+
+    return Distances(float(outward + inward), float(outward), spread * MARGIN + floor)
+
+
+def make_cage(dst: Object, vertex_extrusion: np.ndarray) -> Object:
+    # Copy of the bake target with every vertex pushed out along its normal by its own distance
+    mesh = dst.data.copy()
+    mesh.name = CAGE_OBJ_NAME
+
+    co = np.empty(len(mesh.vertices) * 3, dtype=np.float64)
+    mesh.vertices.foreach_get("co", co)
+    normal = np.empty(len(mesh.vertices) * 3, dtype=np.float64)
+    mesh.vertices.foreach_get("normal", normal)
+
+    # Distances are in world units, vertices move in object space
+    matrix = np.array(dst.matrix_world, dtype=np.float64)[:3, :3]
+    world_normal = normal.reshape(-1, 3) @ np.linalg.inv(matrix)
+    world_normal /= np.maximum(np.linalg.norm(world_normal, axis=1, keepdims=True), 1e-12)
+    offset = (world_normal * vertex_extrusion[:, None]) @ np.linalg.inv(matrix).T
+    mesh.vertices.foreach_set("co", (co.reshape(-1, 3) + offset).astype(np.float32).ravel())
+
+    cage = bpy.data.objects.new(CAGE_OBJ_NAME, mesh)
+    cage.matrix_world = dst.matrix_world
+    bpy.context.view_layer.layer_collection.collection.objects.link(cage)
+    return cage
+
+
+class MSFSBake_EstimateDistances(bpy.types.Operator):
+    bl_idname = "msfsbake.estimate_distances"
+    bl_label = "Estimate ray distances"
+    bl_description = "Measures how far the source surface strays from the target and sets tight ray distance and extrusion values"
+
+    @classmethod
+    def poll(cls, context: Context) -> bool:
+        settings = context.scene.msfs_properties
+        return bool(source_objects(settings)) and bool(estimate_targets(settings))
+
+    def execute(self, context: Context) -> None:
+        settings = context.scene.msfs_properties
+
+        # Measured on the evaluated meshes, placed the way the bake places them
+        srcs = [bake_object(obj, "MSFSBake_Estimate_Source") for obj in source_objects(settings)]
+        targets = estimate_targets(settings)
+        atlas = settings.use_dst_collection and not settings.use_lod_queue
+        dst = joined_object(targets, "MSFSBake_Estimate_Target") if atlas else bake_object(targets[0], "MSFSBake_Estimate_Target")
+        try:
+            if settings.obj_align and not settings.use_src_collection and not atlas:
+                dst.location = srcs[0].location
+            context.view_layer.update()
+            distances = estimate(srcs, dst)
+        finally:
+            for obj in srcs + [dst]:
+                release(obj)
+
+        settings.render_ray_dist = distances.ray_dist
+        settings.render_extrusion = distances.extrusion
+        self.report({"INFO"}, f"Ray distance {distances.ray_dist:.4f}, extrusion {distances.extrusion:.4f}")
+        return {"FINISHED"}
+
+
+def estimate_targets(settings) -> list[Object]:
+    # The first target, all parts of it for an atlas
+    if settings.use_lod_queue:
+        return [lod.dst_obj for lod in settings.lod_targets if lod.dst_obj is not None][:1]
+    return target_objects(settings)
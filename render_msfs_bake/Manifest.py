@@ -0,0 +1,154 @@
+import bpy
+import hashlib
+import json
+import os
+import numpy as np
+from bpy.types import Object, Image
+from . Settings import MSFSBake_Settings
+
+MANIFEST_NAME = "msfsbake_manifest.json"
+
+# Settings that change the result of every map
+HASHED_SETTINGS = (
+    "bake_engine",
+    "render_ray_dist",
+    "render_extrusion",
+    "obj_align",
+    "use_auto_distance",
+    "use_auto_cage",
+    "use_prefilter",
+    "bake_profile",
+    "profile_samples",
+    "profile_denoise",
+    "use_composite_ao",
+    "ao_distance",
+    "ao_samples",
+)
+
+
+def mesh_hash(obj: Object) -> str:
+    # Geometry, UVs and placement of a bake object
+    mesh = obj.data
+    digest = hashlib.sha1()
+
+    co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", co)
+    digest.update(co.tobytes())
+
+    loops = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get("vertex_index", loops)
+    digest.update(loops.tobytes())
+
+    totals = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get("loop_total", totals)
+    digest.update(totals.tobytes())
+
+    # Which material, and so which source slot, each face is baked from
+    materials = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get("material_index", materials)
+    digest.update(materials.tobytes())
+
+    # Smooth and flat shading, sharp edges and custom normals all end up in the normal bake
+    if hasattr(mesh, "calc_normals_split"):
+        mesh.calc_normals_split()
+    normals = np.empty(len(mesh.loops) * 3, dtype=np.float32)
+    mesh.loops.foreach_get("normal", normals)
+    digest.update(normals.tobytes())
+
+    for layer in mesh.uv_layers:
+        uv = np.empty(len(layer.data) * 2, dtype=np.float32)
+        layer.data.foreach_get("uv", uv)
+        digest.update(layer.name.encode())
+        digest.update(uv.tobytes())
+
+    digest.update(np.array(obj.matrix_basis, dtype=np.float32).tobytes())
+    return digest.hexdigest()
+
+
+def image_hash(img: Image | None, known: dict[str, str] | None = None) -> str:
+    # Packed and generated images hash all their pixels, pass known to do that once per bake
+    if img is None:
+        return ""
+    if known is not None and img.name in known:
+        return known[img.name]
+
+    digest = hashlib.sha1()
+    digest.update(f"{img.name}|{img.filepath}|{tuple(img.size)}|{img.colorspace_settings.name}".encode())
+
+    # Files on disk are identified by their stats, anything else by its pixels
+    path = bpy.path.abspath(img.filepath)
+    if img.packed_file is None and not img.is_dirty and os.path.isfile(path):
+        stat = os.stat(path)
+        digest.update(f"{stat.st_mtime_ns}|{stat.st_size}".encode())
+    else:
+        pixels = np.empty(img.size[0] * img.size[1] * img.channels, dtype=np.float32)
+        img.pixels.foreach_get(pixels)
+        digest.update(pixels.tobytes())
+
+    if known is not None:
+        known[img.name] = digest.hexdigest()
+    return digest.hexdigest()
+
+
+def settings_hash(settings: MSFSBake_Settings) -> str:
+    values = [repr(getattr(settings, name)) for name in HASHED_SETTINGS]
+    return hashlib.sha1("|".join(values).encode()).hexdigest()
+
+
+def input_hash(*parts: str) -> str:
+    return hashlib.sha1("|".join(str(p) for p in parts).encode()).hexdigest()
+
+
+class BakeManifest:
+    # Input hashes of every output in a folder, used to skip maps that are up to date
+    def __init__(self, path: str):
+        self.path = bpy.path.abspath(path)
+        self.entries : dict[str, dict] = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f).get("outputs", {})
+        except (OSError, ValueError):
+            pass
+
+    def is_current(self, output: str, digest: str) -> bool:
+        return self.matches(output, "hash", digest)
+
+    def current_entry(self, output: str, digest: str) -> dict | None:
+        # What was recorded with an up to date output, such as its padding
+        if not self.is_current(output, digest):
+            return None
+        return self.entries[os.path.basename(output)]
+
+    def is_mergeable(self, output: str, base: str, geometry: str) -> bool:
+        # Baked with everything but the meshes the same and from the given snapshot, so changed regions can be merged into it.
+        # Maps left out of a partial bake still hold an older geometry than the snapshot.
+        entry = self.entries.get(os.path.basename(output), {})
+        return bool(geometry) and entry.get("geometry") == geometry and self.matches(output, "base", base)
+
+    def matches(self, output: str, key: str, value: str) -> bool:
+        entry = self.entries.get(os.path.basename(output))
+        if entry is None or entry.get(key) != value:
+            return False
+
+        # The file has to be the exact one written by that bake
+        try:
+            stat = os.stat(bpy.path.abspath(output))
+        except OSError:
+            return False
+        return entry.get("mtime") == stat.st_mtime_ns and entry.get("size") == stat.st_size
+
+    def record(self, output: str, digest: str, info: dict) -> None:
+        # Info holds the merge base, snapshot geometry, padding and whether the coverage was kept
+        try:
+            stat = os.stat(bpy.path.abspath(output))
+        except OSError:
+            return
+
+        self.entries[os.path.basename(output)] = {"hash": digest, **info, "mtime": stat.st_mtime_ns, "size": stat.st_size}
+
+        # Written after every map so a cancelled run keeps what it finished
+        try:
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump({"outputs": self.entries}, f, indent=2)
+        except OSError as e:
+            print(f"Could not write bake manifest {self.path}: {e}")
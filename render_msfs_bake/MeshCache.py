@@ -0,0 +1,124 @@
+import bpy
+import bmesh
+from bpy.app.handlers import persistent
+from bpy.types import Object, Mesh, Scene, Depsgraph
+
+CACHE_MESH_PREFIX = "MSFSBake_Cache_"
+
+# The one UV map of a joined atlas object, whatever the parts called theirs
+JOINED_UV_NAME = "MSFSBake_UV"
+
+# Evaluated meshes by original object name, along with the stack they were built from
+_meshes : dict[str, tuple[tuple, str]] = {}
+
+
+def modifier_signature(obj: Object) -> tuple:
+    # Catches stack edits that happened while the depsgraph handler was not running
+    return (obj.data.name, tuple((m.name, m.type, m.show_viewport) for m in obj.modifiers))
+
+
+def evaluated_mesh(obj: Object) -> Mesh:
+    signature = modifier_signature(obj)
+    entry = _meshes.get(obj.name)
+    if entry is not None:
+        mesh = bpy.data.meshes.get(entry[1])
+        if entry[0] == signature and mesh is not None:
+            return mesh
+        invalidate(obj.name)
+
+    # One copy of the evaluated mesh, with every modifier already applied
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    mesh = bpy.data.meshes.new_from_object(obj.evaluated_get(depsgraph), preserve_all_data_layers=True, depsgraph=depsgraph)
+    mesh.name = CACHE_MESH_PREFIX + obj.name
+    _meshes[obj.name] = (signature, mesh.name)
+    return mesh
+
+
+def bake_object(obj: Object, name: str) -> Object:
+    # Lightweight object around the cached mesh, only linked to the scene for the bake
+    copy = bpy.data.objects.new(name, evaluated_mesh(obj))
+    copy.matrix_world = obj.matrix_world
+    bpy.context.view_layer.layer_collection.collection.objects.link(copy)
+    return copy
+
+
+def joined_object(objs: list[Object], name: str) -> Object:
+    # One object holding every part in world space, so a single bake covers all of them
+    bm = bmesh.new()
+    for obj in objs:
+        part = evaluated_mesh(obj).copy()
+        part.transform(obj.matrix_world)
+        # Layers are merged by name, so each part brings only the UV map it renders with, under one shared name
+        active = part.uv_layers.active
+        # Looked up by name each time, removing a layer moves the others
+        for layer_name in [l.name for l in part.uv_layers if active is None or l.name != active.name]:
+            part.uv_layers.remove(part.uv_layers[layer_name])
+        if part.uv_layers:
+            part.uv_layers[0].name = JOINED_UV_NAME
+        bm.from_mesh(part)
+        bpy.data.meshes.remove(part)
+
+    mesh = bpy.data.meshes.new(name)
+    bm.to_mesh(mesh)
+    bm.free()
+
+    if JOINED_UV_NAME in mesh.uv_layers:
+        mesh.uv_layers.active = mesh.uv_layers[JOINED_UV_NAME]
+        mesh.uv_layers.active.active_render = True
+
+    joined = bpy.data.objects.new(name, mesh)
+    bpy.context.view_layer.layer_collection.collection.objects.link(joined)
+    return joined
+
+
+def release(obj: Object) -> None:
+    # Remove a bake object, keeping its mesh if it is still the cached copy
+    mesh = obj.data
+    bpy.data.objects.remove(obj)
+    if mesh.users == 0 and not any(entry[1] == mesh.name for entry in _meshes.values()):
+        bpy.data.meshes.remove(mesh)
+
+
+def invalidate(name: str) -> None:
+    entry = _meshes.pop(name, None)
+    if entry is not None:
+        mesh = bpy.data.meshes.get(entry[1])
+        if mesh is not None and mesh.users == 0:
+            bpy.data.meshes.remove(mesh)
+
+
+def clear() -> None:
+    for name in list(_meshes):
+        invalidate(name)
+
+
+@persistent
+def on_depsgraph_update(scene: Scene, depsgraph: Depsgraph) -> None:
+    if not _meshes:
+        return
+
+    # Transform only updates keep the cache, the mesh is stored in object space
+    for update in depsgraph.updates:
+        if update.is_updated_geometry and isinstance(update.id, Object):
+            invalidate(update.id.name)
+
+
+@persistent
+def on_load(_) -> None:
+    # Cached names point into the previous file
+    _meshes.clear()
+
+
+def register_handlers() -> None:
+    if on_depsgraph_update not in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.append(on_depsgraph_update)
+    if on_load not in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.append(on_load)
+
+
+def unregister_handlers() -> None:
+    clear()
+    if on_depsgraph_update in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(on_depsgraph_update)
+    if on_load in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(on_load)
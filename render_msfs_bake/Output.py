@@ -0,0 +1,238 @@
+import bpy
+import os
+import struct
+import zlib
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, Future
+from bpy.types import Image
+from . Dds import write_dds
+from . Resample import resize, srgb_to_linear, linear_to_srgb
+from . Padding import pad, resized_coverage, save_coverage
+
+# Rows encoded per step, bounds memory when writing from a disk backed buffer
+STRIP_ROWS = 256
+
+# Scanlines per block in ZIP compressed EXR files
+EXR_ZIP_LINES = 16
+
+# Encoding runs off the main thread, leave one core to Blender
+WRITER_THREADS = max(1, min(4, (os.cpu_count() or 2) - 1))
+
+FORMAT_EXTENSIONS = {
+    'PNG8': ".png",
+    'PNG16': ".png",
+    'EXR': ".exr",
+    'DDS': ".dds",
+}
+
+FORMAT_ITEMS = [
+    ('PNG8', "PNG 8-bit", "8 bits per channel PNG"),
+    ('PNG16', "PNG 16-bit", "16 bits per channel PNG, bakes into a float buffer"),
+    ('EXR', "OpenEXR", "Half float OpenEXR with ZIP compression, bakes into a float buffer"),
+    ('DDS', "DDS", "Block compressed DDS with a full mip chain, ready for the sim"),
+]
+
+# Formats that need more precision than a byte buffer gives
+FLOAT_FORMATS = {'PNG16', 'EXR'}
+
+
+def png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+
+def write_png(path: str, pixels: np.ndarray, compress_level: int = 6) -> None:
+    # Stream (h, w, c) uint8 or uint16 pixels, stored bottom row first like Blender images, into a PNG.
+    # Only STRIP_ROWS rows are in memory at once, so pixels may be a memmap.
+    height, width, channels = pixels.shape
+    bit_depth = 16 if pixels.dtype == np.uint16 else 8
+    color_type = {1: 0, 2: 4, 3: 2, 4: 6}[channels]
+
+    compressor = zlib.compressobj(compress_level)
+    prev = np.zeros((width * channels * bit_depth // 8,), dtype=np.uint8)
+
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, bit_depth, color_type, 0, 0, 0)))
+
+        for top in range(0, height, STRIP_ROWS):
+            # PNG starts at the top row
+            rows = pixels[max(height - top - STRIP_ROWS, 0):height - top][::-1]
+            if bit_depth == 16:
+                rows = rows.astype(">u2")
+            raw = np.ascontiguousarray(rows).view(np.uint8).reshape(len(rows), -1)
+
+            # "Up" filter, each row stored as the difference to the row above it
+            above = np.vstack([prev[None, :], raw[:-1]])
+            filtered = np.empty((len(raw), raw.shape[1] + 1), dtype=np.uint8)
+            filtered[:, 0] = 2
+            filtered[:, 1:] = raw - above
+            prev = raw[-1].copy()
+
+            data = compressor.compress(filtered.tobytes())
+            if data:
+                f.write(png_chunk(b"IDAT", data))
+
+        f.write(png_chunk(b"IDAT", compressor.flush()))
+        f.write(png_chunk(b"IEND", b""))
+
+
+def write_exr(path: str, pixels: np.ndarray, compress_level: int = 6) -> None:
+    # Scanline, half float, ZIP compressed OpenEXR of (h, w, c) pixels stored bottom row first
+    height, width, channels = pixels.shape
+    names = ["R", "G", "B", "A"][:channels] if channels > 1 else ["Y"]
+    order = sorted(range(channels), key=lambda c: names[c])
+
+    def attribute(name: str, kind: str, value: bytes) -> bytes:
+        return name.encode() + b"\0" + kind.encode() + b"\0" + struct.pack("<i", len(value)) + value
+
+    chlist = b"".join(names[c].encode() + b"\0" + struct.pack("<iB3xii", 1, 0, 1, 1) for c in order) + b"\0"
+    window = struct.pack("<iiii", 0, 0, width - 1, height - 1)
+    header = (struct.pack("<ii", 20000630, 2)
+              + attribute("channels", "chlist", chlist)
+              + attribute("compression", "compression", b"\x03")
+              + attribute("dataWindow", "box2i", window)
+              + attribute("displayWindow", "box2i", window)
+              + attribute("lineOrder", "lineOrder", b"\x00")
+              + attribute("pixelAspectRatio", "float", struct.pack("<f", 1.0))
+              + attribute("screenWindowCenter", "v2f", struct.pack("<ff", 0.0, 0.0))
+              + attribute("screenWindowWidth", "float", struct.pack("<f", 1.0))
+              + b"\0")
+
+    # EXR starts at the top row, every line stores each channel in turn
+    half = pixels[::-1].astype("<f2")[:, :, order]
+    chunks = []
+    for y in range(0, height, EXR_ZIP_LINES):
+        raw = np.ascontiguousarray(half[y:y + EXR_ZIP_LINES].transpose(0, 2, 1)).view(np.uint8).ravel()
+
+        # Split even and odd bytes, then delta encode them, as the ZIP codec expects
+        reordered = np.concatenate([raw[0::2], raw[1::2]])
+        delta = reordered.astype(np.int16)
+        delta[1:] = reordered[1:].astype(np.int16) - reordered[:-1] + 128
+        data = zlib.compress((delta & 0xFF).astype(np.uint8).tobytes(), compress_level)
+        if len(data) >= len(raw):
+            data = raw.tobytes()
+        chunks.append(struct.pack("<ii", y, len(data)) + data)
+
+    offset = len(header) + 8 * len(chunks)
+    offsets = []
+    for chunk in chunks:
+        offsets.append(offset)
+        offset += len(chunk)
+
+    with open(path, "wb") as f:
+        f.write(header)
+        f.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+        for chunk in chunks:
+            f.write(chunk)
+
+
+def pull_pixels(image: Image) -> np.ndarray:
+    # One copy of the image, independent of the image buffer so it can be baked into again
+    width, height = image.size
+    pixels = np.empty(width * height * 4, dtype=np.float32)
+    image.pixels.foreach_get(pixels)
+    return pixels.reshape(height, width, 4)
+
+
+def read_output(path: str, fmt: str, bake_type: str, is_linear: bool) -> np.ndarray:
+    # A written output loaded back into the color space it was baked in, the reverse of encode
+    img = bpy.data.images.load(bpy.path.abspath(path), check_existing=False)
+    try:
+        # Read as stored, without any conversion on load
+        img.colorspace_settings.name = "Non-Color"
+        pixels = pull_pixels(img)
+    finally:
+        bpy.data.images.remove(img)
+
+    if bake_type == 'NORMAL':
+        return pixels
+    if fmt == 'EXR' and not is_linear:
+        return linear_to_srgb(pixels)
+    if fmt != 'EXR' and is_linear:
+        return srgb_to_linear(pixels)
+    return pixels
+
+
+def clear_pixels(image: Image) -> None:
+    # Fully transparent, so the texels a bake writes to can be told apart afterwards
+    image.pixels.foreach_set(np.zeros(image.size[0] * image.size[1] * 4, dtype=np.float32))
+
+
+def pack_occlusion(pixels: np.ndarray, is_linear: bool, occlusion: np.ndarray, occlusion_linear: bool) -> np.ndarray:
+    # Geometry occlusion multiplied into the red, occlusion, channel of a composite map, in linear space
+    ao = occlusion[:, :, 0] if occlusion_linear else srgb_to_linear(occlusion[:, :, 0])
+    red = pixels[:, :, 0] if is_linear else srgb_to_linear(pixels[:, :, 0])
+    pixels[:, :, 0] = red * ao if is_linear else linear_to_srgb(red * ao)
+    return pixels
+
+
+def encode(path: str, pixels: np.ndarray, fmt: str, compress_level: int, block_format: str, bake_type: str, is_linear: bool) -> None:
+    # Color data is stored as sRGB in PNG and DDS files and linear in EXR files, normals are written as is
+    is_color = bake_type != 'NORMAL'
+    if fmt == 'EXR':
+        if is_color and not is_linear:
+            pixels = srgb_to_linear(pixels)
+        write_exr(path, pixels, compress_level)
+        return
+
+    if is_color and is_linear:
+        pixels = linear_to_srgb(pixels)
+    if fmt == 'DDS':
+        write_dds(path, np.clip(pixels, 0.0, 1.0), block_format, bake_type)
+    elif fmt == 'PNG16':
+        write_png(path, (np.clip(pixels, 0.0, 1.0) * 65535.0 + 0.5).astype(np.uint16), compress_level)
+    else:
+        write_png(path, (np.clip(pixels, 0.0, 1.0) * 255.0 + 0.5).astype(np.uint8), compress_level)
+
+
+def pad_output(pixels: np.ndarray, mask: np.ndarray, padding: int, coverage_path: str) -> np.ndarray:
+    # The coverage is written before padding hides it, the output is only recorded once it is on disk too
+    if coverage_path:
+        save_coverage(coverage_path, mask)
+    return pad(pixels, mask, padding)
+
+
+def encode_padded(path: str, padded: Future, fmt: str, compress_level: int, block_format: str, bake_type: str, is_linear: bool) -> None:
+    # Waits for the padding queued before it, the pool runs jobs in order so it is already running or done
+    encode(path, padded.result(), fmt, compress_level, block_format, bake_type, is_linear)
+
+
+def encode_resized(path: str, padded: Future, mask: np.ndarray, padding: int, width: int, height: int, filter_type: str, fmt: str,
+                   compress_level: int, block_format: str, bake_type: str, is_linear: bool) -> None:
+    # A smaller LOD output filtered down from a finished bake, padded again at its own size
+    small = resize(padded.result(), width, height, bake_type, is_linear, filter_type)
+    small = pad(small, resized_coverage(mask, width, height), padding)
+    encode(path, small, fmt, compress_level, block_format, bake_type, is_linear)
+
+
+def encode_buffer(path: str, buffer_path: str, shape: tuple, compress_level: int) -> None:
+    # Write a finished tile buffer from disk, then drop it
+    buffer = np.memmap(buffer_path, dtype=np.uint8, mode="r", shape=shape)
+    write_png(path, buffer, compress_level)
+    del buffer
+    os.remove(buffer_path)
+
+
+class ImageWriter:
+    # Encodes and writes outputs on background threads while the next map bakes
+    def __init__(self, workers: int = WRITER_THREADS):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="msfsbake_writer")
+
+    def submit_pad(self, pixels: np.ndarray, mask: np.ndarray, padding: int, coverage_path: str = "") -> Future:
+        # Padded in place off the main thread, every output of the map is encoded from the result
+        return self.pool.submit(pad_output, pixels, mask, padding, coverage_path)
+
+    def submit(self, path: str, padded: Future, fmt: str, compress_level: int, block_format: str, bake_type: str, is_linear: bool) -> Future:
+        return self.pool.submit(encode_padded, path, padded, fmt, compress_level, block_format, bake_type, is_linear)
+
+    def submit_resized(self, path: str, padded: Future, mask: np.ndarray, padding: int, width: int, height: int, filter_type: str,
+                       fmt: str, compress_level: int, block_format: str, bake_type: str, is_linear: bool) -> Future:
+        return self.pool.submit(encode_resized, path, padded, mask, padding, width, height, filter_type, fmt, compress_level,
+                                block_format, bake_type, is_linear)
+
+    def submit_buffer(self, path: str, buffer_path: str, shape: tuple, compress_level: int) -> Future:
+        return self.pool.submit(encode_buffer, path, buffer_path, shape, compress_level)
+
+    def shutdown(self) -> None:
+        # Writes already queued are finished, so no half written files are left behind
+        self.pool.shutdown(wait=True)
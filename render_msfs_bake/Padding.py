@@ -0,0 +1,120 @@
+import os
+import numpy as np
+from . Resample import resize_axis
+
+COVERAGE_SUFFIX = ".msfsbake_coverage.npz"
+
+# Seed coordinate of texels nothing has reached yet, far enough away to lose every comparison
+FAR = 1 << 14
+
+NEIGHBOURS = [(dy, dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dy or dx]
+
+
+def grown(mask: np.ndarray, radius: int, axis: int) -> np.ndarray:
+    # Mask grown by radius texels along one axis, doubling the reach with every shift
+    def span(start: int | None, stop: int | None) -> tuple:
+        return (slice(None),) * axis + (slice(start, stop),)
+
+    result = mask.copy()
+    reach = 0
+    while reach < radius:
+        shift = min(reach + 1, radius - reach)
+        before = result.copy()
+        result[span(shift, None)] |= before[span(None, -shift)]
+        result[span(None, -shift)] |= before[span(shift, None)]
+        reach += shift
+    return result
+
+
+def band(mask: np.ndarray, radius: int) -> np.ndarray:
+    # Flat indices of the uncovered texels within radius texels of a covered one along both axes.
+    # Every texel padding can reach lies in it, and so does every step of the flood towards its seed.
+    near = grown(grown(mask, radius, 0), radius, 1)
+    return np.flatnonzero(near & ~mask)
+
+
+def jump_flood(mask: np.ndarray, texels: np.ndarray, radius: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Nearest covered texel of the given uncovered texels, by jump flooding with steps from the radius down to one.
+    # Only the given texels are flooded, covered texels are their own seeds and everything else has none.
+    # Returns the seed rows, columns and squared distances, FAR where no seed was found.
+    h, w = mask.shape
+    # Seed row and column packed into one value, with one extra entry without a seed for neighbours outside the image
+    seeds = np.full(h * w + 1, FAR << 16 | FAR, dtype=np.int32)
+    np.copyto(seeds[:-1].reshape(h, w), np.arange(h, dtype=np.int32)[:, None] << 16 | np.arange(w, dtype=np.int32), where=mask)
+    outside = h * w
+
+    y, x = np.divmod(texels.astype(np.int32), w)
+    current = np.full(len(texels), FAR << 16 | FAR, dtype=np.int32)
+    best = np.full(len(texels), np.iinfo(np.int32).max, dtype=np.int32)
+
+    step = 1 << max(int(radius - 1).bit_length(), 0)
+    while step >= 1:
+        rows = {d: (y + d * step >= 0) & (y + d * step < h) for d in (-1, 1)}
+        cols = {d: (x + d * step >= 0) & (x + d * step < w) for d in (-1, 1)}
+        # Every neighbour is read from the seeds as they were at the start of the step
+        for dy, dx in NEIGHBOURS:
+            inside = rows[dy] & cols[dx] if dy and dx else rows[dy] if dy else cols[dx]
+            candidate = seeds[np.where(inside, texels + (dy * w + dx) * step, outside)]
+            dist = ((candidate >> 16) - y) ** 2 + ((candidate & 0xFFFF) - x) ** 2
+            better = dist < best
+            np.copyto(current, candidate, where=better)
+            np.copyto(best, dist, where=better)
+        seeds[texels] = current
+        step //= 2
+
+    return current >> 16, current & 0xFFFF, best
+
+
+def dilate(pixels: np.ndarray, mask: np.ndarray, padding: int) -> np.ndarray:
+    # Extend every UV island by padding texels with the color of its nearest covered texel, in place.
+    # Only the band around island borders is flooded, so the cost follows the border length.
+    if padding <= 0 or mask.all() or not mask.any():
+        return pixels
+
+    texels = band(mask, padding)
+    seed_y, seed_x, best = jump_flood(mask, texels, padding)
+    fill = best <= padding * padding
+    rows, cols = np.divmod(texels[fill], mask.shape[1])
+    pixels[rows, cols] = pixels[seed_y[fill], seed_x[fill]]
+    return pixels
+
+
+def coverage(pixels: np.ndarray) -> np.ndarray:
+    # Texels the bake wrote to, the bake image starts out fully transparent
+    return pixels[:, :, 3] > 0
+
+
+def coverage_path(output: str) -> str:
+    return os.path.splitext(output)[0] + COVERAGE_SUFFIX
+
+
+def save_coverage(path: str, mask: np.ndarray) -> None:
+    # One bit per texel, the rest of what padding needs is in the output itself
+    try:
+        with open(path, "wb") as f:
+            np.savez_compressed(f, bits=np.packbits(mask), shape=np.array(mask.shape))
+    except OSError as e:
+        print(f"Could not write coverage {path}: {e}")
+
+
+def load_coverage(path: str, width: int, height: int) -> np.ndarray | None:
+    try:
+        with np.load(path) as data:
+            if tuple(data["shape"]) != (height, width):
+                return None
+            return np.unpackbits(data["bits"], count=width * height).astype(bool).reshape(height, width)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def resized_coverage(mask: np.ndarray, width: int, height: int) -> np.ndarray:
+    # Coverage of a smaller output, texels at least half covered count
+    fraction = resize_axis(resize_axis(mask.astype(np.float32), height, 0, 'BOX'), width, 1, 'BOX')
+    return fraction >= 0.5
+
+
+def pad(pixels: np.ndarray, mask: np.ndarray, padding: int) -> np.ndarray:
+    # Dilate, then make the whole image opaque like a Cycles margin would
+    pixels = dilate(pixels, mask, padding)
+    pixels[:, :, 3] = 1.0
+    return pixels
@@ -1,4 +1,7 @@
 from bpy.types import Panel
+from . Bake import progress
+from . Preview import preview_object
+from . Stats import stats, MB
 
 class MSFSBake_Panel(Panel):
     bl_idname = "MSFSBAKE_PT_PANEL"
@@ -13,33 +16,61 @@ class MSFSBake_Panel(Panel):
         layout = self.layout
         layout.label(text="Properties:")
         maincol = layout.column()
+        maincol.enabled = not progress.running
 
         # Object selection
         objbox = maincol.box()
         objboxcol = objbox.column()
 
         highPolyRow = objboxcol.row(align=True)
-        highPolyRow.prop(settings, "src_obj", text="", icon="SPHERE")
-        if settings.src_obj and not settings.src_obj.visible_get():
-            highPolyRow.operator("view3d.toggle_obj_vis_high", icon="HIDE_ON", text="")
+        highPolyRow.prop(settings, "use_src_collection", text="", icon="OUTLINER_COLLECTION")
+        if settings.use_src_collection:
+            highPolyRow.prop(settings, "src_collection", text="")
         else:
-            highPolyRow.operator("view3d.toggle_obj_vis_high", icon="HIDE_OFF", text="")
+            highPolyRow.prop(settings, "src_obj", text="", icon="SPHERE")
+            if settings.src_obj and not settings.src_obj.visible_get():
+                highPolyRow.operator("view3d.toggle_obj_vis_high", icon="HIDE_ON", text="")
+            else:
+                highPolyRow.operator("view3d.toggle_obj_vis_high", icon="HIDE_OFF", text="")
 
         lowPolyRow = objboxcol.row(align=True)
-        lowPolyRow.prop(settings, "dst_obj", text="", icon="MESH_ICOSPHERE")
-        if settings.dst_obj and not settings.dst_obj.visible_get():
-            lowPolyRow.operator("view3d.toggle_obj_vis_low", icon="HIDE_ON", text="")
+        lowPolyRow.prop(settings, "use_dst_collection", text="", icon="TEXTURE")
+        if settings.use_dst_collection:
+            lowPolyRow.prop(settings, "dst_collection", text="")
         else:
-            lowPolyRow.operator("view3d.toggle_obj_vis_low", icon="HIDE_OFF", text="")
+            lowPolyRow.prop(settings, "dst_obj", text="", icon="MESH_ICOSPHERE")
+            if settings.dst_obj and not settings.dst_obj.visible_get():
+                lowPolyRow.operator("view3d.toggle_obj_vis_low", icon="HIDE_ON", text="")
+            else:
+                lowPolyRow.operator("view3d.toggle_obj_vis_low", icon="HIDE_OFF", text="")
 
         objboxcol.separator()
         objboxcol.operator("view3d.toggle_high_low_vis", text="Toggle High/Low")
         maincol.separator()
 
         # Bake distance settings
-        maincol.prop(settings, "render_ray_dist")
-        maincol.prop(settings, "render_extrusion")
-        maincol.prop(settings, "obj_align", text="Origin Alignment", toggle=True)
+        maincol.prop(settings, "bake_engine", text="")
+        if settings.bake_engine == 'CYCLES':
+            profilecol = maincol.column(align=True)
+            profilecol.prop(settings, "bake_profile", text="")
+            if settings.bake_profile == 'CUSTOM':
+                profilecol.prop(settings, "profile_samples")
+                profilecol.prop(settings, "profile_threads")
+                profilecol.prop(settings, "profile_tile_size")
+                profilecol.prop(settings, "profile_denoise", toggle=True)
+        distcol = maincol.column(align=True)
+        distcol.enabled = not settings.use_auto_distance
+        distcol.prop(settings, "render_ray_dist")
+        distcol.prop(settings, "render_extrusion")
+        autorow = maincol.row(align=True)
+        autorow.prop(settings, "use_auto_distance", toggle=True)
+        cagerow = autorow.row(align=True)
+        cagerow.enabled = settings.bake_engine == 'CYCLES'
+        cagerow.prop(settings, "use_auto_cage", toggle=True)
+        autorow.operator("msfsbake.estimate_distances", text="", icon="DRIVER_DISTANCE")
+        alignrow = maincol.row()
+        alignrow.enabled = not settings.use_src_collection and not settings.use_dst_collection
+        alignrow.prop(settings, "obj_align", text="Origin Alignment", toggle=True)
         maincol.separator()
 
         # Bake dimensions and padding
@@ -63,7 +94,10 @@ class MSFSBake_Panel(Panel):
 
         resboxpaddingarea = resboxcol.row(align=True)
         resboxpaddingarea.label(text="Padding")
-        resboxpaddingarea.prop(settings, "output_padding", text="")
+        paddingvalue = resboxpaddingarea.row(align=True)
+        paddingvalue.enabled = not settings.use_map_padding
+        paddingvalue.prop(settings, "output_padding", text="")
+        resboxpaddingarea.prop(settings, "use_map_padding", text="", icon="PROPERTIES")
         
         linkarea = resboxcol.row(align=True)
         linkarea.label(text="Dimensions")
@@ -72,6 +106,12 @@ class MSFSBake_Panel(Panel):
             linkarea.operator("view3d.toggle_width_lock", text="Linked", icon="LINKED")
         else:
             linkarea.operator("view3d.toggle_width_lock", text="Unlinked", icon="UNLINKED")
+
+        tilearea = resboxcol.row(align=True)
+        tilearea.prop(settings, "use_tiled_bake", toggle=True, icon="MESH_GRID")
+        tilesizearea = tilearea.row(align=True)
+        tilesizearea.enabled = settings.use_tiled_bake
+        tilesizearea.prop(settings, "tile_size", text="")
         maincol.separator()
 
         # Folder setup
@@ -81,6 +121,17 @@ class MSFSBake_Panel(Panel):
         filerow = folderboxcol.row()
         filerow.label(text="File Prefix")
         filerow.prop(settings, "output_file_prefix", text="")
+        formatcol = folderboxcol.column(align=True)
+        for name, label in (("diffuse", "Color"), ("normal", "Normal"), ("composite", "Composite")):
+            formatrow = formatcol.row(align=True)
+            formatrow.label(text=label)
+            formatrow.prop(settings, f"output_format_{name}", text="")
+            if getattr(settings, f"output_format_{name}") == 'DDS':
+                formatrow.prop(settings, f"output_dds_{name}", text="")
+            else:
+                formatrow.prop(settings, f"output_compression_{name}", text="")
+            if settings.use_map_padding:
+                formatrow.prop(settings, f"output_padding_{name}", text="")
         maincol.separator()
 
         # Bake map options
@@ -89,7 +140,76 @@ class MSFSBake_Panel(Panel):
         bakeoptionsbox.prop(settings, "render_is_diffuse_enabled", toggle=True, text="Color", icon="SHADING_SOLID")
         bakeoptionsbox.prop(settings, "render_is_normal_enabled", toggle=True, text="Normal", icon="SHADING_RENDERED")
         bakeoptionsbox.prop(settings, "render_is_composite_enabled", toggle=True, text="Composite", icon="MATERIAL")
+        if settings.render_is_composite_enabled:
+            aorow = bakeoptionsbox.row(align=True)
+            aorow.prop(settings, "use_composite_ao", toggle=True, icon="SHADING_TEXTURE")
+            aosettings = aorow.row(align=True)
+            aosettings.enabled = settings.use_composite_ao
+            aosettings.prop(settings, "ao_distance", text="")
+            aosettings.prop(settings, "ao_samples", text="")
+        maincol.separator()
+
+        # LOD queue
+        lodbox = maincol.box()
+        lodboxcol = lodbox.column()
+        lodboxcol.prop(settings, "use_lod_queue", toggle=True, icon="MOD_DECIM")
+        if settings.use_lod_queue:
+            for i, lod in enumerate(settings.lod_targets):
+                lodcol = lodboxcol.box().column(align=True)
+                lodobjrow = lodcol.row(align=True)
+                lodobjrow.prop(lod, "dst_obj", text="", icon="MESH_ICOSPHERE")
+                lodobjrow.operator("view3d.lod_remove", text="", icon="X").index = i
+                lodresrow = lodcol.row(align=True)
+                lodresrow.prop(lod, "output_width", text="W")
+                lodresrow.prop(lod, "output_height", text="H")
+                if i > 0:
+                    lodresrow.prop(lod, "derive", text="", icon="LINKED")
+                lodcol.prop(lod, "output_file_prefix", text="")
+            lodboxcol.operator("view3d.lod_add", text="Add LOD", icon="ADD")
+            if any(lod.derive for lod in settings.lod_targets):
+                lodboxcol.prop(settings, "derive_filter", text="Filter")
         maincol.separator()
 
         # Bake!
-        maincol.operator("msfsbake.bake", text="Bake")
+        maincol.prop(settings, "use_prefilter", toggle=True, icon="IMAGE_REFERENCE")
+        bakerow = maincol.row(align=True)
+        bakerow.prop(settings, "force_rebake", toggle=True, icon="FILE_REFRESH")
+        bakerow.prop(settings, "use_partial_rebake", toggle=True, icon="SELECT_SUBTRACT")
+        bakerow.prop(settings, "use_stats_log", toggle=True, icon="TEXT")
+        if preview_object() is not None:
+            previewrow = maincol.row(align=True)
+            previewrow.operator("msfsbake.preview_confirm", text="Bake Full Size", icon="CHECKMARK")
+            previewrow.operator("msfsbake.preview_discard", text="", icon="X")
+        else:
+            bakebuttonrow = maincol.row(align=True)
+            bakebuttonrow.operator("msfsbake.preview", text="Preview", icon="HIDE_OFF")
+            bakebuttonrow.operator("msfsbake.bake", text="Bake")
+
+        # Progress of a running bake
+        if progress.running:
+            progressbox = layout.box()
+            progressboxcol = progressbox.column(align=True)
+            progressboxcol.label(text=f"Stage {progress.done}/{progress.total}: {progress.stage}")
+            eta = progress.eta()
+            eta_text = f"{eta:.0f}s" if eta is not None else "--"
+            progressboxcol.label(text=f"Elapsed {progress.elapsed():.0f}s, remaining ~{eta_text}")
+            progressboxcol.operator("msfsbake.cancel", text="Cancel", icon="CANCEL")
+
+        # Breakdown of the last bake
+        elif stats.status:
+            statsbox = layout.box()
+            statsboxcol = statsbox.column(align=True)
+            statsheader = statsboxcol.row()
+            statsheader.prop(settings, "show_stats", text="", emboss=False,
+                             icon="TRIA_DOWN" if settings.show_stats else "TRIA_RIGHT")
+            statsheader.label(text=f"Last bake {stats.status}: {stats.total:.1f}s, peak {stats.peak / MB:.0f} MB")
+            slowest = stats.slowest()
+            if slowest is not None:
+                statsboxcol.label(text=f"Slowest: {slowest['label']} ({slowest['seconds']:.1f}s)")
+            if settings.show_stats:
+                for stage in stats.stages:
+                    stagerow = statsboxcol.row()
+                    stagerow.label(text=stage["label"])
+                    # Python's share is only traced for bakes that log their stats
+                    python = f", Python {stage['python_peak'] / MB:.0f} MB" if stage["python_peak"] else ""
+                    stagerow.label(text=f"{stage['seconds']:.2f}s, peak {stage['peak'] / MB:.0f} MB{python}")
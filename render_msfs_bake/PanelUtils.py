@@ -1,5 +1,6 @@
 import bpy
 from bpy.types import Operator, Context, Object
+from bpy.props import IntProperty
 
 def get_high(context: Context) -> Object:
     settings = context.scene.msfs_properties
@@ -133,4 +134,33 @@ class MSFSBake_HeightPlus(Operator):
     def execute(self, context: Context) -> None:
         settings = context.scene.msfs_properties
         settings.output_height = next_pow_of_two(settings.output_height)
+        return {'FINISHED'}
+
+
+class MSFSBake_LodAdd(Operator):
+    bl_idname = "view3d.lod_add"
+    bl_label = "Add LOD"
+    bl_description = "Adds the current destination object and resolution to the LOD queue"
+
+    def execute(self, context: Context) -> None:
+        settings = context.scene.msfs_properties
+        lod = settings.lod_targets.add()
+        lod.dst_obj = settings.dst_obj
+        lod.output_width = settings.output_width
+        lod.output_height = settings.output_height
+        lod.output_file_prefix = settings.output_file_prefix
+        return {'FINISHED'}
+
+
+class MSFSBake_LodRemove(Operator):
+    bl_idname = "view3d.lod_remove"
+    bl_label = "Remove LOD"
+    bl_description = "Removes this entry from the LOD queue"
+
+    index: IntProperty(default=0)
+
+    def execute(self, context: Context) -> None:
+        settings = context.scene.msfs_properties
+        if 0 <= self.index < len(settings.lod_targets):
+            settings.lod_targets.remove(self.index)
         return {'FINISHED'}
\ No newline at end of file
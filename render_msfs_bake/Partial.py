@@ -0,0 +1,160 @@
+import bmesh
+import hashlib
+import os
+import numpy as np
+from typing import NamedTuple
+from bpy.types import Object
+from mathutils.bvhtree import BVHTree
+from . Distance import world_mesh
+from . Transfer import rasterize
+
+SNAPSHOT_SUFFIX = ".msfsbake_snapshot.npz"
+
+# Changed source triangles looked up one by one, a change this large is baked in full anyway
+MAX_CHANGED_TRIS = 100000
+
+# Share of the target faces above which a full bake is simpler than merging
+MAX_AFFECTED = 0.5
+
+
+class MeshSnapshot(NamedTuple):
+    # World space geometry a target was last baked with, stored next to its outputs
+    src_co: np.ndarray
+    src_tris: np.ndarray
+    dst_co: np.ndarray
+    dst_tris: np.ndarray
+    # UVs of every target triangle corner
+    dst_uv: np.ndarray
+    # Ray distance and extrusion, a change affects every texel
+    rays: np.ndarray
+
+
+def take_snapshot(srcs: list[Object], dst: Object, rays: tuple[float, float]) -> MeshSnapshot:
+    src_co, src_tris, offset = [], [], 0
+    for src in srcs:
+        co, tris = world_mesh(src)
+        src_co.append(co)
+        src_tris.append(tris + offset)
+        offset += len(co)
+    dst_co, dst_tris = world_mesh(dst)
+
+    mesh = dst.data
+    loops = np.empty(len(mesh.loop_triangles) * 3, dtype=np.int32)
+    mesh.loop_triangles.foreach_get("loops", loops)
+    uv = np.empty(len(mesh.loops) * 2, dtype=np.float32)
+    mesh.uv_layers.active.data.foreach_get("uv", uv)
+
+    return MeshSnapshot(np.concatenate(src_co).astype(np.float32), np.concatenate(src_tris),
+                        dst_co.astype(np.float32), dst_tris, uv.reshape(-1, 2)[loops].reshape(-1, 3, 2),
+                        np.array(rays, dtype=np.float32))
+
+
+def snapshot_hash(snapshot: MeshSnapshot) -> str:
+    # Recorded with every output baked from this geometry, only those can be merged into against it later
+    digest = hashlib.sha1()
+    for field in snapshot:
+        digest.update(np.ascontiguousarray(field).tobytes())
+    return digest.hexdigest()
+
+
+def save_snapshot(path: str, snapshot: MeshSnapshot) -> None:
+    try:
+        with open(path, "wb") as f:
+            np.savez(f, **snapshot._asdict())
+    except OSError as e:
+        print(f"Could not write mesh snapshot {path}: {e}")
+
+
+def drop_snapshot(path: str) -> None:
+    # Outputs rewritten without a snapshot would be merged into against stale geometry later
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"Could not remove mesh snapshot {path}: {e}")
+
+
+def load_snapshot(path: str) -> MeshSnapshot | None:
+    try:
+        with np.load(path) as data:
+            return MeshSnapshot(**{field: data[field] for field in MeshSnapshot._fields})
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def rows(co: np.ndarray) -> np.ndarray:
+    # Each position as one opaque value, so whole points can be looked up in a set
+    co = np.ascontiguousarray(co)
+    return co.view(np.dtype((np.void, co.dtype.itemsize * co.shape[1]))).ravel()
+
+
+def changed_triangles(old: MeshSnapshot, new: MeshSnapshot) -> np.ndarray:
+    # Corners of every source triangle that moved, appeared or disappeared, at their old and new positions
+    old_corners = old.src_co[old.src_tris]
+    new_corners = new.src_co[new.src_tris]
+    if old.src_co.shape == new.src_co.shape and np.array_equal(old.src_tris, new.src_tris):
+        moved = (old_corners != new_corners).reshape(len(new_corners), -1).any(axis=1)
+        return np.concatenate([old_corners[moved], new_corners[moved]])
+    old_rows, new_rows = rows(old_corners.reshape(-1, 9)), rows(new_corners.reshape(-1, 9))
+    return np.concatenate([old_corners[~np.isin(old_rows, new_rows)], new_corners[~np.isin(new_rows, old_rows)]])
+
+
+def affected_faces(old: MeshSnapshot, new: MeshSnapshot, radius: float) -> np.ndarray | None:
+    # Target triangles whose texels can differ from the last bake, None when everything has to be baked again.
+    # That is every triangle that moved itself, and every one within reach of source geometry that changed.
+    if (old.dst_tris.shape != new.dst_tris.shape or not np.array_equal(old.dst_tris, new.dst_tris)
+            or not np.array_equal(old.dst_uv, new.dst_uv) or not np.array_equal(old.rays, new.rays)):
+        return None
+
+    moved = (old.dst_co != new.dst_co).any(axis=1)
+    faces = moved[new.dst_tris].any(axis=1)
+
+    corners = changed_triangles(old, new)
+    if len(corners) > MAX_CHANGED_TRIS:
+        return None
+    if len(corners):
+        # Every point of a triangle lies within its farthest corner from its center,
+        # so searching that much further around the center covers the whole surface
+        centers = corners.mean(axis=1)
+        extents = np.linalg.norm(corners - centers[:, None], axis=2).max(axis=1)
+        bvh = BVHTree.FromPolygons(new.dst_co.tolist(), new.dst_tris.tolist(), all_triangles=True)
+        find_nearest_range = bvh.find_nearest_range
+        for center, extent in zip(centers.tolist(), extents.tolist()):
+            for _, _, index, _ in find_nearest_range(center, radius + extent):
+                faces[index] = True
+
+    if not faces.any() or faces.mean() > MAX_AFFECTED:
+        return None
+    return faces
+
+
+def keep_faces(obj: Object, faces: np.ndarray) -> None:
+    # Strip the bake object down to the polygons of the given triangles, on its own copy of the mesh
+    obj.data = obj.data.copy()
+    mesh = obj.data
+    mesh.calc_loop_triangles()
+    polygon = np.empty(len(mesh.loop_triangles), dtype=np.int32)
+    mesh.loop_triangles.foreach_get("polygon_index", polygon)
+    keep = np.zeros(len(mesh.polygons), dtype=bool)
+    keep[polygon[faces]] = True
+
+    bm = bmesh.new()
+    bm.from_mesh(mesh)
+    bm.faces.ensure_lookup_table()
+    bmesh.ops.delete(bm, geom=[f for f in bm.faces if not keep[f.index]], context='FACES')
+    bm.to_mesh(mesh)
+    bm.free()
+
+
+def uv_coverage(snapshot: MeshSnapshot, width: int, height: int) -> np.ndarray:
+    # Texels covered by the whole target, the changed faces are only part of it
+    mask = np.zeros(width * height, dtype=bool)
+    mask[rasterize(snapshot.dst_uv.astype(np.float64), width, height)[0]] = True
+    return mask.reshape(height, width)
+
+
+def merge_region(existing: np.ndarray, pixels: np.ndarray, mask: np.ndarray, coverage: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Freshly baked texels over the previous output, with the coverage of the whole target for padding
+    existing[mask] = pixels[mask]
+    return existing, coverage | mask
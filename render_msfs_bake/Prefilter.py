@@ -0,0 +1,121 @@
+import bpy
+import numpy as np
+from bpy.types import Object, Image
+from . Resample import resize
+from . Manifest import image_hash
+
+PREFILTER_IMAGE_PREFIX = "MSFSBake_Prefiltered_"
+
+# Source texels kept per target texel, so Cycles still has something to antialias
+OVERSAMPLE = 2.0
+
+# Not worth a copy unless the image shrinks by at least this much
+MIN_REDUCTION = 0.75
+
+PREFILTER_KIND = 'KAISER'
+
+# Prefiltered copies by source image and size, oldest dropped first
+CACHE_SIZE = 16
+_images : dict[tuple, str] = {}
+
+
+def uv_density(obj: Object, material_index: int | None = None) -> float | None:
+    # UV area per world area, over the faces of one material slot or the whole mesh
+    mesh = obj.data
+    if mesh.uv_layers.active is None:
+        return None
+    mesh.calc_loop_triangles()
+
+    n_tri = len(mesh.loop_triangles)
+    loops = np.empty(n_tri * 3, dtype=np.int32)
+    mesh.loop_triangles.foreach_get("loops", loops)
+    verts = np.empty(n_tri * 3, dtype=np.int32)
+    mesh.loop_triangles.foreach_get("vertices", verts)
+    if material_index is not None:
+        material = np.empty(n_tri, dtype=np.int32)
+        mesh.loop_triangles.foreach_get("material_index", material)
+        keep = np.repeat(material == material_index, 3)
+        loops, verts = loops[keep], verts[keep]
+
+    uv = np.empty(len(mesh.loops) * 2, dtype=np.float64)
+    mesh.uv_layers.active.data.foreach_get("uv", uv)
+    uv = uv.reshape(-1, 2)[loops].reshape(-1, 3, 2)
+
+    co = np.empty(len(mesh.vertices) * 3, dtype=np.float64)
+    mesh.vertices.foreach_get("co", co)
+    matrix = np.array(obj.matrix_world, dtype=np.float64)
+    co = (co.reshape(-1, 3) @ matrix[:3, :3].T)[verts].reshape(-1, 3, 3)
+
+    e1 = uv[:, 1] - uv[:, 0]
+    e2 = uv[:, 2] - uv[:, 0]
+    uv_area = np.abs(e1[:, 0] * e2[:, 1] - e1[:, 1] * e2[:, 0]).sum() / 2
+    world_area = np.linalg.norm(np.cross(co[:, 1] - co[:, 0], co[:, 2] - co[:, 0]), axis=1).sum() / 2
+    if uv_area <= 0 or world_area <= 0:
+        return None
+    return uv_area / world_area
+
+
+def pow2_at_least(value: float) -> int:
+    return 1 << max(int(np.ceil(np.log2(max(value, 1.0)))), 0)
+
+
+def prefilter_size(img: Image, src_density: float | None, dst_density: float | None, width: int, height: int) -> tuple[int, int] | None:
+    # Smallest power of two size that still gives the target OVERSAMPLE source texels per texel
+    if src_density is None or dst_density is None or img.size[0] == 0 or img.size[1] == 0:
+        return None
+    needed = np.sqrt(width * height * dst_density / src_density) * OVERSAMPLE
+    scale = needed / np.sqrt(img.size[0] * img.size[1])
+    if scale > MIN_REDUCTION:
+        return None
+    return (min(pow2_at_least(img.size[0] * scale), img.size[0]),
+            min(pow2_at_least(img.size[1] * scale), img.size[1]))
+
+
+def prefiltered(img: Image, bake_type: str, width: int, height: int, known: dict[str, str] | None = None) -> Image:
+    key = (image_hash(img, known), bake_type, width, height)
+    name = _images.get(key)
+    if name is not None and name in bpy.data.images:
+        return bpy.data.images[name]
+
+    # Full resolution pixels are only read once per source image and size
+    pixels = np.empty(img.size[0] * img.size[1] * 4, dtype=np.float32)
+    img.pixels.foreach_get(pixels)
+    is_linear = img.is_float or img.colorspace_settings.is_data
+    small = resize(pixels.reshape(img.size[1], img.size[0], 4), width, height, bake_type, is_linear, PREFILTER_KIND)
+
+    copy = bpy.data.images.new(f"{PREFILTER_IMAGE_PREFIX}{img.name}_{width}x{height}", width=width, height=height,
+                               alpha=True, float_buffer=img.is_float)
+    copy.colorspace_settings.name = img.colorspace_settings.name
+    copy.pixels.foreach_set(small.astype(np.float32).ravel())
+
+    if len(_images) >= CACHE_SIZE:
+        old = bpy.data.images.get(_images.pop(next(iter(_images))))
+        if old is not None and old.users == 0:
+            bpy.data.images.remove(old)
+    _images[key] = copy.name
+    return copy
+
+
+def prefilter_textures(slots: list[tuple[Object, int]], dst: Object, slot_textures: list[dict[str, Image | None]], bake_types: list[str],
+                       width: int, height: int, known: dict[str, str] | None = None) -> list[dict[str, Image | None]]:
+    # Source textures of every slot, given as source object and slot index,
+    # swapped for a prefiltered copy where the target samples them sparsely
+    dst_density = uv_density(dst)
+    result = []
+    for (src, index), textures in zip(slots, slot_textures):
+        src_density = uv_density(src, index)
+        filtered = dict(textures)
+        for bake_type in bake_types:
+            img = textures[bake_type]
+            size = prefilter_size(img, src_density, dst_density, width, height) if img is not None else None
+            filtered[bake_type] = prefiltered(img, bake_type, *size, known) if size is not None else img
+        result.append(filtered)
+    return result
+
+
+def clear() -> None:
+    for name in _images.values():
+        img = bpy.data.images.get(name)
+        if img is not None and img.users == 0:
+            bpy.data.images.remove(img)
+    _images.clear()
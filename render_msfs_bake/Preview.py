@@ -0,0 +1,158 @@
+import bpy
+import numpy as np
+from bpy.types import Context, Object, Material, Image
+from . Bake import BakeJob, BakeTarget, progress, redraw_panels
+from . MeshCache import bake_object, joined_object
+
+PREVIEW_OBJ_NAME = "MSFSBake_Preview"
+PREVIEW_MATERIAL_NAME = "MSFSBake_Preview_Material"
+PREVIEW_IMAGE_PREFIX = "MSFSBake_Preview_"
+
+
+def preview_object() -> Object | None:
+    return bpy.data.objects.get(PREVIEW_OBJ_NAME)
+
+
+def preview_image(bake_type: str, pixels: np.ndarray, is_linear: bool) -> Image:
+    height, width = pixels.shape[:2]
+    img = bpy.data.images.new(PREVIEW_IMAGE_PREFIX + bake_type, width=width, height=height, alpha=True, float_buffer=is_linear)
+    if bake_type != 'DIFFUSE':
+        img.colorspace_settings.name = "Non-Color"
+    img.pixels.foreach_set(pixels.astype(np.float32).ravel())
+    return img
+
+
+def preview_material(images: dict[str, Image]) -> Material:
+    # Viewport material showing the baked maps the way MSFS reads them
+    mat = bpy.data.materials.new(name=PREVIEW_MATERIAL_NAME)
+    mat.use_nodes = True
+    nodes = mat.node_tree.nodes
+    links = mat.node_tree.links
+    bsdf = next(n for n in nodes if n.type == 'BSDF_PRINCIPLED')
+
+    if 'DIFFUSE' in images:
+        color_node = nodes.new("ShaderNodeTexImage")
+        color_node.image = images['DIFFUSE']
+        links.new(bsdf.inputs['Base Color'], color_node.outputs['Color'])
+
+    if 'NORMAL' in images:
+        normal_node = nodes.new("ShaderNodeTexImage")
+        normal_node.image = images['NORMAL']
+        normal_map_node = nodes.new("ShaderNodeNormalMap")
+        links.new(normal_map_node.inputs['Color'], normal_node.outputs['Color'])
+        links.new(bsdf.inputs['Normal'], normal_map_node.outputs['Normal'])
+
+    # Occlusion, roughness and metallic in red, green and blue
+    if 'COMPOSITE' in images:
+        comp_node = nodes.new("ShaderNodeTexImage")
+        comp_node.image = images['COMPOSITE']
+        separate_node = nodes.new("ShaderNodeSeparateColor")
+        links.new(separate_node.inputs['Color'], comp_node.outputs['Color'])
+        links.new(bsdf.inputs['Roughness'], separate_node.outputs['Green'])
+        links.new(bsdf.inputs['Metallic'], separate_node.outputs['Blue'])
+
+    return mat
+
+
+def show_preview(target: BakeTarget, previews: dict[str, tuple[np.ndarray, bool]]) -> Object:
+    # A copy of the target wearing the preview maps
+    images = {bake_type: preview_image(bake_type, pixels, is_linear) for bake_type, (pixels, is_linear) in previews.items()}
+    mat = preview_material(images)
+
+    if target.parts:
+        obj = joined_object(target.parts, PREVIEW_OBJ_NAME)
+    else:
+        obj = bake_object(target.dst_obj, PREVIEW_OBJ_NAME)
+        # The cached mesh is shared with the bake, the preview gets its own
+        obj.data = obj.data.copy()
+    obj.data.materials.clear()
+    obj.data.materials.append(mat)
+
+    # Drawn over the target rather than hiding it, a hidden target could no longer be picked
+    obj.show_in_front = True
+    return obj
+
+
+def discard_preview() -> None:
+    obj = preview_object()
+    if obj is None:
+        return
+
+    mesh = obj.data
+    mats = [m for m in mesh.materials if m is not None]
+    bpy.data.objects.remove(obj)
+    if mesh.users == 0:
+        bpy.data.meshes.remove(mesh)
+    for mat in mats:
+        if mat.users == 0:
+            bpy.data.materials.remove(mat)
+
+    for img in list(bpy.data.images):
+        if img.name.startswith(PREVIEW_IMAGE_PREFIX) and img.users == 0:
+            bpy.data.images.remove(img)
+
+
+class MSFSBake_Preview(bpy.types.Operator):
+    bl_idname = "msfsbake.preview"
+    bl_label = "Preview bake"
+    bl_description = "Quickly bakes every selected map at a fraction of the output size and shows it on the target, without writing any files"
+
+    @classmethod
+    def poll(cls, context: Context) -> bool:
+        return not progress.running
+
+    def execute(self, context: Context) -> None:
+        discard_preview()
+
+        job = BakeJob(context.scene.msfs_properties, preview=True)
+        error = job.validate()
+        if error is not None:
+            self.report({"ERROR"}, error)
+            return {"CANCELLED"}
+
+        for _ in job.run():
+            pass
+
+        show_preview(job.targets[0], job.previews)
+        redraw_panels(context)
+        target = job.targets[0]
+        self.report({"INFO"}, f"Preview baked at {target.width}x{target.height}, confirm to bake at full size")
+        return {"FINISHED"}
+
+
+class MSFSBake_PreviewConfirm(bpy.types.Operator):
+    bl_idname = "msfsbake.preview_confirm"
+    bl_label = "Confirm preview"
+    bl_description = "Removes the preview and starts the full size bake"
+
+    @classmethod
+    def poll(cls, context: Context) -> bool:
+        return preview_object() is not None and not progress.running
+
+    def execute(self, context: Context) -> None:
+        # The preview stays up when the bake can not start, so the settings can be fixed first.
+        # Checked here, an error reported by the bake operator would reach us as an exception.
+        error = BakeJob(context.scene.msfs_properties).validate()
+        if error is not None:
+            self.report({"ERROR"}, error)
+            return {"CANCELLED"}
+
+        bpy.ops.msfsbake.bake('INVOKE_DEFAULT')
+        discard_preview()
+        redraw_panels(context)
+        return {"FINISHED"}
+
+
+class MSFSBake_PreviewDiscard(bpy.types.Operator):
+    bl_idname = "msfsbake.preview_discard"
+    bl_label = "Discard preview"
+    bl_description = "Removes the preview without baking"
+
+    @classmethod
+    def poll(cls, context: Context) -> bool:
+        return preview_object() is not None
+
+    def execute(self, context: Context) -> None:
+        discard_preview()
+        redraw_panels(context)
+        return {"FINISHED"}
@@ -0,0 +1,87 @@
+from contextlib import contextmanager
+from bpy.types import Scene
+
+# A texture transfer needs one ray per texel, nothing is being lit
+FAST_SAMPLES = 1
+
+PROFILE_ITEMS = [
+    ('FAST', "Fast", "One sample, no denoising and every thread, enough to transfer textures"),
+    ('CUSTOM', "Custom", "Bake with the samples, threads, tile size and denoising set below"),
+    ('SCENE', "Scene", "Bake with the scene's own Cycles settings"),
+]
+
+
+class RenderProfile:
+    # Render settings changed for a bake, each one remembered so it can be put back
+    def __init__(self, scene: Scene):
+        self.scene = scene
+        self.saved : list[tuple[object, str, object]] = []
+
+    def set(self, owner: object, attr: str, value) -> None:
+        if owner is None or not hasattr(owner, attr):
+            return
+        self.saved.append((owner, attr, getattr(owner, attr)))
+        setattr(owner, attr, value)
+
+    def apply(self, settings, bake_profile: str) -> None:
+        render = self.scene.render
+        # Missing when the Cycles add-on is disabled, its settings are then skipped
+        cycles = getattr(self.scene, "cycles", None)
+        self.set(render, "engine", 'CYCLES')
+
+        if bake_profile == 'FAST':
+            self.set(cycles, "samples", FAST_SAMPLES)
+            self.set(cycles, "use_adaptive_sampling", False)
+            self.set(cycles, "use_denoising", False)
+            self.set(render, "threads_mode", 'AUTO')
+        elif bake_profile == 'CUSTOM':
+            self.set(cycles, "samples", settings.profile_samples)
+            self.set(cycles, "use_denoising", settings.profile_denoise)
+            if settings.profile_threads > 0:
+                self.set(render, "threads_mode", 'FIXED')
+                self.set(render, "threads", settings.profile_threads)
+            else:
+                self.set(render, "threads_mode", 'AUTO')
+            self.set(cycles, "use_auto_tile", True)
+            self.set(cycles, "tile_size", settings.profile_tile_size)
+
+        # Ambient occlusion bakes reach as far as the world's AO distance
+        if settings.render_is_composite_enabled and settings.use_composite_ao and self.scene.world is not None:
+            self.set(self.scene.world.light_settings, "distance", settings.ao_distance)
+
+    @contextmanager
+    def override(self, owner: object, attr: str, value):
+        # A setting that only holds for part of the bake, such as the samples of the occlusion pass
+        previous = getattr(owner, attr)
+        setattr(owner, attr, value)
+        try:
+            yield
+        finally:
+            setattr(owner, attr, previous)
+
+    @contextmanager
+    def only_render(self, objs: list):
+        # Every other object hidden from render for part of the bake, put back right after it
+        keep = {obj.name for obj in objs}
+        mark = len(self.saved)
+        for obj in self.scene.objects:
+            if obj.name not in keep and not obj.hide_render:
+                self.set(obj, "hide_render", True)
+        try:
+            yield
+        finally:
+            for owner, attr, value in reversed(self.saved[mark:]):
+                try:
+                    setattr(owner, attr, value)
+                except (ReferenceError, AttributeError, TypeError) as e:
+                    print(f"Could not restore {attr}: {e}")
+            del self.saved[mark:]
+
+    def restore(self) -> None:
+        # Newest first, so a setting changed twice ends up with its original value
+        for owner, attr, value in reversed(self.saved):
+            try:
+                setattr(owner, attr, value)
+            except (ReferenceError, AttributeError, TypeError) as e:
+                print(f"Could not restore {attr}: {e}")
+        self.saved.clear()
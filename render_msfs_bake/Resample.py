@@ -0,0 +1,118 @@
+import numpy as np
+
+# Kaiser windowed sinc, radius in source texels at the output scale
+KAISER_RADIUS = 3.0
+KAISER_ALPHA = 4.0
+
+FILTER_ITEMS = [
+    ('BOX', "Box", "Average of the covered texels, fast and soft"),
+    ('KAISER', "Kaiser", "Kaiser windowed sinc, sharper with little ringing"),
+]
+
+
+def srgb_to_linear(x: np.ndarray) -> np.ndarray:
+    return np.where(x <= 0.04045, x / 12.92, ((x + 0.055) / 1.055) ** 2.4)
+
+
+def linear_to_srgb(x: np.ndarray) -> np.ndarray:
+    x = np.clip(x, 0.0, 1.0)
+    return np.where(x <= 0.0031308, x * 12.92, 1.055 * x ** (1.0 / 2.4) - 0.055)
+
+
+def kernel(x: np.ndarray, kind: str) -> np.ndarray:
+    if kind == 'BOX':
+        return ((x >= -0.5) & (x < 0.5)).astype(np.float64)
+
+    inside = np.abs(x) < KAISER_RADIUS
+    window = np.i0(KAISER_ALPHA * np.sqrt(np.clip(1.0 - (x / KAISER_RADIUS) ** 2, 0.0, 1.0))) / np.i0(KAISER_ALPHA)
+    return np.where(inside, np.sinc(x) * window, 0.0)
+
+
+def axis_weights(src: int, dst: int, kind: str) -> tuple[np.ndarray, np.ndarray]:
+    # Source indices and weights (dst, taps) for one axis, indices may run past the edges
+    scale = max(src / dst, 1.0)
+    radius = (0.5 if kind == 'BOX' else KAISER_RADIUS) * scale
+    center = (np.arange(dst) + 0.5) * (src / dst) - 0.5
+    taps = int(np.ceil(radius * 2)) + 1
+
+    index = np.floor(center - radius).astype(np.int64)[:, None] + np.arange(taps)[None, :]
+    weight = kernel((index - center[:, None]) / scale, kind)
+
+    # Box taps that miss every texel center still need some weight
+    empty = weight.sum(axis=1) == 0
+    weight[empty] = 0
+    weight[empty, np.clip(np.rint(center[empty] - index[empty, 0]).astype(np.int64), 0, taps - 1)] = 1
+
+    weight /= weight.sum(axis=1, keepdims=True)
+    return index, weight.astype(np.float32)
+
+
+def resize_axis(pixels: np.ndarray, dst: int, axis: int, kind: str) -> np.ndarray:
+    src = pixels.shape[axis]
+    if src == dst:
+        return pixels
+
+    # Exact integer box reduction is a plain reshape and mean
+    if kind == 'BOX' and src % dst == 0:
+        shape = list(pixels.shape)
+        shape[axis:axis + 1] = [dst, src // dst]
+        return pixels.reshape(shape).mean(axis=axis + 1)
+
+    index, weight = axis_weights(src, dst, kind)
+    out = None
+
+    if src % dst == 0:
+        # Every output texel has the same weights over an evenly spaced run of taps,
+        # so each tap is a strided slice of the edge padded pixels
+        factor = src // dst
+        before = max(-index[0, 0], 0)
+        pad = [(0, 0)] * pixels.ndim
+        pad[axis] = (before, max(index[-1, -1] - (src - 1), 0))
+        padded = np.pad(pixels, pad, mode="edge")
+
+        for tap in range(index.shape[1]):
+            start = index[0, tap] + before
+            view = [slice(None)] * pixels.ndim
+            view[axis] = slice(start, start + factor * (dst - 1) + 1, factor)
+            term = padded[tuple(view)] * weight[0, tap]
+            if out is None:
+                out = term
+            else:
+                out += term
+        return out
+
+    index = np.clip(index, 0, src - 1)
+    for tap in range(index.shape[1]):
+        w = weight[:, tap].reshape([-1 if a == axis else 1 for a in range(pixels.ndim)])
+        term = np.take(pixels, index[:, tap], axis=axis) * w
+        if out is None:
+            out = term
+        else:
+            out += term
+    return out
+
+
+def resize(pixels: np.ndarray, width: int, height: int, bake_type: str, is_linear: bool, kind: str = 'BOX') -> np.ndarray:
+    # Resize (h, w, 4) pixels in the space that suits the map:
+    # color is filtered in linear light, normals are averaged as vectors and renormalized
+    if bake_type == 'NORMAL':
+        kind = 'BOX'
+
+    pixels = pixels.astype(np.float32)
+    if bake_type == 'DIFFUSE' and not is_linear:
+        pixels = pixels.copy()
+        pixels[:, :, :3] = srgb_to_linear(pixels[:, :, :3])
+    elif bake_type == 'NORMAL':
+        pixels = pixels.copy()
+        pixels[:, :, :3] = pixels[:, :, :3] * 2.0 - 1.0
+
+    out = resize_axis(resize_axis(pixels, height, 0, kind), width, 1, kind)
+
+    if bake_type == 'DIFFUSE' and not is_linear:
+        out[:, :, :3] = linear_to_srgb(out[:, :, :3])
+    elif bake_type == 'NORMAL':
+        n = out[:, :, :3]
+        n /= np.maximum(np.linalg.norm(n, axis=2, keepdims=True), 1e-6)
+        out[:, :, :3] = n * 0.5 + 0.5
+
+    return np.clip(out, 0.0, 1.0) if not is_linear or bake_type == 'NORMAL' else out
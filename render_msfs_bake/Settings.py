@@ -1,7 +1,90 @@
 import bpy
 from os import path
-from bpy.types import Object, Context, Scene
-from bpy.props import BoolProperty, StringProperty, FloatProperty, IntProperty, PointerProperty, EnumProperty
+from bpy.app.handlers import persistent
+from bpy.types import Object, Context, Scene, Depsgraph, LayerCollection, Collection
+from bpy.props import BoolProperty, StringProperty, FloatProperty, IntProperty, PointerProperty, EnumProperty, CollectionProperty
+from . Output import FORMAT_ITEMS
+from . Dds import BLOCK_FORMAT_ITEMS
+from . Resample import FILTER_ITEMS
+from . Profile import PROFILE_ITEMS
+
+MIN_RES = 8
+MAX_RES = 32768
+MAX_UNTILED_RES = 8192
+DEFAULT_RES = 512
+DEFAULT_PREFIX = "BakedOutput"
+
+# Names of the meshes that can be picked, per scene and view layer.
+# Dropped whenever objects are linked, unlinked, renamed or change visibility, rebuilt on next use.
+_eligible : dict[tuple[str, str], set[str]] = {}
+_msgbus_owner = object()
+
+
+def visible_meshes(scene: Scene, view_layer) -> set[str]:
+    return {o.name for o in scene.objects if o.type == "MESH" and o.visible_get(view_layer=view_layer)}
+
+
+def eligible_objects(context: Context) -> set[str]:
+    key = (context.scene.name, context.view_layer.name)
+    names = _eligible.get(key)
+    if names is None:
+        names = visible_meshes(context.scene, context.view_layer)
+        _eligible[key] = names
+    return names
+
+
+def invalidate_eligible(scene: Scene = None) -> None:
+    _eligible.clear()
+
+    # Only now can a picked object have become ineligible
+    check_ob_in_scene(scene or bpy.context.scene)
+
+
+@persistent
+def on_depsgraph_update(scene: Scene, depsgraph: Depsgraph) -> None:
+    # Linking and unlinking objects updates their collections
+    if depsgraph.id_type_updated('COLLECTION'):
+        invalidate_eligible(scene)
+        return
+
+    # Hiding objects, with H, the outliner or hide_set, only changes the bases of the view layer and shows up
+    # as a scene update. Those come with every selection and property edit too, so only drop the set when
+    # the visible meshes actually changed, and only if there is a set to drop.
+    if depsgraph.id_type_updated('SCENE'):
+        names = _eligible.get((scene.name, depsgraph.view_layer.name))
+        if names is not None and names != visible_meshes(scene, depsgraph.view_layer):
+            invalidate_eligible(scene)
+
+
+@persistent
+def on_load(_) -> None:
+    # Message bus subscriptions do not survive loading a file
+    _eligible.clear()
+    subscribe()
+
+
+def subscribe() -> None:
+    # Renames and visibility toggles that do not show up as collection updates
+    for key in ((Object, "name"), (Object, "hide_viewport"), (Collection, "hide_viewport"),
+                (LayerCollection, "exclude"), (LayerCollection, "hide_viewport")):
+        bpy.msgbus.subscribe_rna(key=key, owner=_msgbus_owner, args=(), notify=invalidate_eligible)
+
+
+def register_handlers() -> None:
+    if on_depsgraph_update not in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.append(on_depsgraph_update)
+    if on_load not in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.append(on_load)
+    subscribe()
+
+
+def unregister_handlers() -> None:
+    bpy.msgbus.clear_by_owner(_msgbus_owner)
+    if on_depsgraph_update in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(on_depsgraph_update)
+    if on_load in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(on_load)
+    _eligible.clear()
 
 
 def check_ob_in_scene(scene: Scene) -> None:
@@ -17,16 +100,30 @@ def check_ob_in_scene(scene: Scene) -> None:
         if not filter_objects(None, settings.dst_obj):
            settings.dst_obj = None
 
+    for lod in settings.lod_targets:
+        if lod.dst_obj is not None and not filter_objects(None, lod.dst_obj):
+            lod.dst_obj = None
+
 
 def update_file_prefix(_, context: Context) -> None:
     settings = context.scene.msfs_properties
 
-    # Auto switch output file prefix
-    if settings.dst_obj is not None:
+    # Auto switch output file prefix, an atlas is named after its collection
+    if settings.use_dst_collection and settings.dst_collection is not None:
+        settings.output_file_prefix = settings.dst_collection.name
+    elif settings.dst_obj is not None:
         settings.output_file_prefix = settings.dst_obj.name
     else:
         settings.output_file_prefix = settings.default_prefix
 
+
+def update_lod_prefix(lod, _) -> None:
+    # Same as above, but for a single LOD queue entry
+    if lod.dst_obj is not None:
+        lod.output_file_prefix = lod.dst_obj.name
+    else:
+        lod.output_file_prefix = DEFAULT_PREFIX
+
 def filter_objects(_, object : Object) -> bool:
     # Exclude Lights, Cameras, etc
     if object.type != "MESH":
@@ -37,27 +134,54 @@ def filter_objects(_, object : Object) -> bool:
         return False
     
     # Exclude unchecked view layers
-    return object.name in bpy.context.scene.objects and object.visible_get(view_layer=bpy.context.view_layer)
+    return object.name in eligible_objects(bpy.context)
+
+def source_objects(settings) -> list[Object]:
+    # The meshes baked from, either the picked object or every visible mesh of the picked collection
+    if not settings.use_src_collection:
+        return [settings.src_obj] if settings.src_obj is not None else []
+    if settings.src_collection is None:
+        return []
+    eligible = eligible_objects(bpy.context)
+    return [o for o in settings.src_collection.all_objects if o.type == "MESH" and o.name in eligible]
+
+
+def target_objects(settings) -> list[Object]:
+    # The meshes baked into, either the picked object or every visible mesh of the atlas collection
+    if not settings.use_dst_collection:
+        return [settings.dst_obj] if settings.dst_obj is not None else []
+    if settings.dst_collection is None:
+        return []
+    eligible = eligible_objects(bpy.context)
+    return [o for o in settings.dst_collection.all_objects if o.type == "MESH" and o.name in eligible]
 
 def update_width(_, context: Context) -> None:
     settings = context.scene.msfs_properties
     if settings.output_are_dimensions_linked:
         settings.output_height = settings.output_width
-    
+
+
+class MSFSBake_LodTarget(bpy.types.PropertyGroup):
+    dst_obj: PointerProperty(name="Target Object", type=Object, poll=filter_objects, update=update_lod_prefix)
+    output_width: IntProperty(name="Width", default=DEFAULT_RES, min=MIN_RES, max=MAX_RES)
+    output_height: IntProperty(name="Height", default=DEFAULT_RES, min=MIN_RES, max=MAX_RES)
+    output_file_prefix: StringProperty(name="Output File Prefix", default=DEFAULT_PREFIX)
+    derive: BoolProperty(name="Derive", default=False, description="Filter this LOD's textures down from the baked LOD above it instead of baking again, for LODs that share its UV layout")
+
+
 class MSFSBake_Settings(bpy.types.PropertyGroup):
     bl_idname = "msfsbake.settings"
     bl_label = "Bake selected mesh maps"
     bl_description = "Bakes all selected mesh maps"
 
-    min_res = 8
-    max_res = 8192
-    default_res = 512
+    min_res = MIN_RES
+    max_res = MAX_RES
+    default_res = DEFAULT_RES
     default_padding = 2
-    default_prefix = "BakedOutput"
-    desktop = path.expanduser("~\\Desktop")
+    default_prefix = DEFAULT_PREFIX
+    desktop = path.join(path.expanduser("~"), "Desktop")
 
     # Save and restore user preferences and selection
-    prev_engine = StringProperty(name="Prev Render Engine", default='EEVEE')
     prev_active = None
     prev_selection = []
 
@@ -69,25 +193,68 @@ class MSFSBake_Settings(bpy.types.PropertyGroup):
 
     # Initalize Variables
     src_obj: PointerProperty(name="Source Object", type=Object, poll=filter_objects)
+    src_collection: PointerProperty(name="Source Collection", type=Collection, description="Every visible mesh in this collection and its children is baked from")
+    use_src_collection: BoolProperty(name="Bake From Collection", default=False, description="Bake from a whole collection of high poly objects instead of a single source object")
     dst_obj: PointerProperty(name="Destination Object", type=Object, poll=filter_objects, update=update_file_prefix)
+    dst_collection: PointerProperty(name="Atlas Collection", type=Collection, update=update_file_prefix, description="Every visible mesh in this collection and its children is baked into one shared texture")
+    use_dst_collection: BoolProperty(name="Bake Into Atlas", default=False, update=update_file_prefix, description="Bake a whole collection of low poly parts with non overlapping UVs into one texture atlas, with one bake per map")
 
     render_ray_dist: FloatProperty(name="Ray Distance", default=0.000, precision=3, min=0.0, step=1, subtype='DISTANCE')
     render_extrusion: FloatProperty(name="Extrusion Distance", default=0.10, precision=2, min=0.0, step=10, subtype='DISTANCE')
     obj_align: BoolProperty(name="Align Objects", default=True)
+    use_auto_distance: BoolProperty(name="Auto Distances", default=False, description="Measure every target against the source at bake time and use tight ray distance and extrusion values instead of the ones above")
+    use_auto_cage: BoolProperty(name="Auto Cage", default=False, description="Bake through a per-vertex cage that clears the source surface by just enough at every vertex (Cycles only)")
+
+    bake_engine: EnumProperty(name="Bake Engine", default='CYCLES', items=[
+        ('CYCLES', "Cycles", "Bake every map with a Cycles bake pass"),
+        ('TRANSFER', "Texel Transfer", "Ray cast once per texel and sample the source textures directly, reusing the result across maps and re-bakes"),
+    ])
+
+    # Cycles settings used while baking, the scene's own are restored afterwards
+    bake_profile: EnumProperty(name="Render Profile", items=PROFILE_ITEMS, default='FAST')
+    profile_samples: IntProperty(name="Samples", default=16, min=1, max=4096)
+    profile_threads: IntProperty(name="Threads", default=0, min=0, max=1024, description="Render threads, 0 uses every core")
+    profile_tile_size: IntProperty(name="Tile Size", default=2048, min=8, max=16384, description="Cycles render tile size in pixels")
+    profile_denoise: BoolProperty(name="Denoise", default=False)
 
     output_width: IntProperty(name="Width", default=default_res, min=min_res, max=max_res, update=update_width)
     output_height: IntProperty(name="Height", default=default_res, min=min_res, max=max_res)
     output_padding: IntProperty(name="Padding", default=default_padding, min=0, max=64)
+    use_map_padding: BoolProperty(name="Padding Per Map", default=False, description="Set the padding of each map on its own. Changing only the padding re-pads the existing outputs instead of baking them again")
+    output_padding_diffuse: IntProperty(name="Color Padding", default=default_padding, min=0, max=64)
+    output_padding_normal: IntProperty(name="Normal Padding", default=default_padding, min=0, max=64)
+    output_padding_composite: IntProperty(name="Composite Padding", default=default_padding, min=0, max=64)
     output_are_dimensions_linked: BoolProperty(name="Link Dimensions", default=True)
 
+    use_tiled_bake: BoolProperty(name="Tiled Bake", default=False, description="Bake the output in tiles written to disk one at a time, so memory use depends on the tile size instead of the output size")
+    tile_size: IntProperty(name="Tile Size", default=2048, min=256, max=MAX_UNTILED_RES)
+
     output_folder: StringProperty(name="Output Folder", default=desktop, description="Choose an export path", subtype='DIR_PATH')
     output_file_prefix: StringProperty(name="Output File Prefix", default="BakeOutput")
 
+    output_format_diffuse: EnumProperty(name="Color Format", items=FORMAT_ITEMS, default='PNG8')
+    output_format_normal: EnumProperty(name="Normal Format", items=FORMAT_ITEMS, default='PNG8')
+    output_format_composite: EnumProperty(name="Composite Format", items=FORMAT_ITEMS, default='PNG8')
+    output_compression_diffuse: IntProperty(name="Color Compression", default=6, min=0, max=9)
+    output_compression_normal: IntProperty(name="Normal Compression", default=6, min=0, max=9)
+    output_compression_composite: IntProperty(name="Composite Compression", default=6, min=0, max=9)
+    output_dds_diffuse: EnumProperty(name="Color DDS Format", default='BC1', items=[i for i in BLOCK_FORMAT_ITEMS if i[0] in ('BC1', 'BC3', 'BC7')])
+    output_dds_normal: EnumProperty(name="Normal DDS Format", default='BC5', items=[i for i in BLOCK_FORMAT_ITEMS if i[0] in ('BC5', 'BC3')])
+    output_dds_composite: EnumProperty(name="Composite DDS Format", default='BC7', items=[i for i in BLOCK_FORMAT_ITEMS if i[0] in ('BC7', 'BC3')])
+
     render_is_diffuse_enabled: BoolProperty(name="Enable Diffuse Bake", default=True)
     render_is_normal_enabled: BoolProperty(name="Enable Normal Bake", default=True)
     render_is_composite_enabled: BoolProperty(name="Enable Composite Bake", default=True)
+    use_composite_ao: BoolProperty(name="Geometry AO", default=False, description="Bake ambient occlusion from the source mesh into the red channel of the composite map, on top of the source occlusion")
+    ao_distance: FloatProperty(name="AO Distance", default=0.5, min=0.001, precision=3, step=1, subtype='DISTANCE', description="How far occluding geometry is searched for")
+    ao_samples: IntProperty(name="AO Samples", default=64, min=1, max=4096, description="Cycles samples of the occlusion pass, independent of the render profile")
+    use_stats_log: BoolProperty(name="Log Bake Stats", default=False, description="Append the time and memory of every stage to msfsbake_stats.jsonl in the output folder")
+    show_stats: BoolProperty(name="Show Stage Breakdown", default=False)
+    use_prefilter: BoolProperty(name="Prefilter Sources", default=False, description="Bake from smaller, filtered copies of source textures that are far larger than the target can show. Copies are kept for repeat bakes")
+    force_rebake: BoolProperty(name="Force Re-bake", default=False, description="Bake every map even if its inputs have not changed since the last bake")
+    use_partial_rebake: BoolProperty(name="Partial Re-bake", default=False, description="Only bake the texture regions of faces near geometry that changed since the last bake, and merge them into the existing PNG or EXR outputs")
 
-
-    # Add callback for deleted objects
-    if not check_ob_in_scene in bpy.app.handlers.depsgraph_update_post:
-        bpy.app.handlers.depsgraph_update_post.append(check_ob_in_scene)
\ No newline at end of file
+    # LOD queue, baked against one shared source setup
+    use_lod_queue: BoolProperty(name="Bake LOD Queue", default=False, description="Bake every LOD in the queue instead of the single destination object")
+    lod_targets: CollectionProperty(name="LOD Targets", type=MSFSBake_LodTarget)
+    derive_filter: EnumProperty(name="Derive Filter", items=FILTER_ITEMS, default='KAISER', description="Filter used for color and composite maps of derived LODs, normals are always averaged and renormalized")
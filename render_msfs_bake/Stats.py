@@ -0,0 +1,184 @@
+import ctypes
+import datetime
+import json
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+
+STATS_LOG_NAME = "msfsbake_stats.jsonl"
+
+MB = 1024 * 1024
+
+# Seconds between samples of the resident memory while a bake runs
+SAMPLE_INTERVAL = 0.02
+
+
+class ProcessMemoryCounters(ctypes.Structure):
+    _fields_ = [
+        ("cb", ctypes.c_ulong),
+        ("PageFaultCount", ctypes.c_ulong),
+        ("PeakWorkingSetSize", ctypes.c_size_t),
+        ("WorkingSetSize", ctypes.c_size_t),
+        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+        ("QuotaPagedPoolUsage", ctypes.c_size_t),
+        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+        ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+        ("PagefileUsage", ctypes.c_size_t),
+        ("PeakPagefileUsage", ctypes.c_size_t),
+    ]
+
+
+def process_memory() -> tuple[int, int]:
+    # Current and peak resident memory of the whole Blender process in bytes, zero where unknown.
+    # This includes Cycles and image buffers, which Python's own tracing never sees.
+    if sys.platform == "win32":
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        kernel32 = ctypes.windll.kernel32
+        kernel32.GetCurrentProcess.restype = ctypes.c_void_p
+        if ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.c_void_p(kernel32.GetCurrentProcess()), ctypes.byref(counters), counters.cb):
+            return counters.WorkingSetSize, counters.PeakWorkingSetSize
+        return 0, 0
+
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    peak = peak if sys.platform == "darwin" else peak * 1024
+
+    current = 0
+    try:
+        with open("/proc/self/statm", "r") as f:
+            current = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    return current, peak
+
+
+class MemorySampler:
+    # Highest resident memory seen since the last reset, sampled on a background thread.
+    # The operating system only keeps the peak since the process started, which can not tell stages apart.
+    def __init__(self):
+        self.peak = 0
+        self.stop_event = threading.Event()
+        self.thread : threading.Thread | None = None
+
+    def start(self) -> None:
+        self.reset()
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name="msfsbake_memory", daemon=True)
+        self.thread.start()
+
+    def run(self) -> None:
+        while not self.stop_event.wait(SAMPLE_INTERVAL):
+            self.peak = max(self.peak, process_memory()[0])
+
+    def reset(self) -> int:
+        # The peak so far, then start over from the memory in use right now
+        current = process_memory()[0]
+        peak = max(self.peak, current)
+        self.peak = current
+        return peak
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+
+def stage_group(label: str) -> str:
+    # Tiles of one map are reported as a single stage
+    return re.sub(r" tile \d+/\d+$", "", label)
+
+
+class BakeStats:
+    # Wall time and memory of every stage of the last bake, shared with the panel
+    def __init__(self):
+        self.stages : list[dict] = []
+        self.status = ""
+        self.total = 0.0
+        self.peak = 0
+        self.start_time = 0.0
+        self.stage_start = 0.0
+        self.traced = False
+        self.current : dict | None = None
+        self.sampler = MemorySampler()
+
+    def begin(self, trace: bool = False) -> None:
+        self.stages = []
+        self.current = None
+        self.status = "running"
+        self.total = 0.0
+        self.peak = 0
+        self.start_time = time.perf_counter()
+        self.stage_start = self.start_time
+
+        # NumPy reports its buffers to tracemalloc, so this catches the pixel arrays too.
+        # Tracing slows down every allocation, so only bakes that log their stats pay for it.
+        self.traced = trace and not tracemalloc.is_tracing()
+        if self.traced:
+            tracemalloc.start()
+        self.sampler.start()
+
+    def stage(self, label: str) -> None:
+        self.close_stage()
+        group = stage_group(label)
+        stage = next((s for s in self.stages if s["label"] == group), None)
+        if stage is None:
+            stage = {"label": group, "seconds": 0.0, "python_peak": 0, "peak": 0}
+            self.stages.append(stage)
+        stage["open"] = True
+        self.current = stage
+        self.stage_start = time.perf_counter()
+        self.sampler.reset()
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+
+    def close_stage(self) -> None:
+        stage = self.current
+        if stage is None or not stage["open"]:
+            return
+
+        stage["open"] = False
+        stage["seconds"] += time.perf_counter() - self.stage_start
+        if tracemalloc.is_tracing():
+            stage["python_peak"] = max(stage["python_peak"], tracemalloc.get_traced_memory()[1])
+        stage["peak"] = max(stage["peak"], self.sampler.reset())
+
+    def end(self, status: str) -> None:
+        self.close_stage()
+        self.status = status
+        self.total = time.perf_counter() - self.start_time
+        self.sampler.stop()
+        self.peak = max((s["peak"] for s in self.stages), default=0)
+        if self.traced:
+            tracemalloc.stop()
+            self.traced = False
+
+    def slowest(self) -> dict | None:
+        return max(self.stages, key=lambda s: s["seconds"], default=None)
+
+    def log(self, folder: str, info: dict) -> None:
+        # One JSON object per bake, appended so a folder collects the history of its bakes
+        entry = {
+            "time": datetime.datetime.now().isoformat(timespec="seconds"),
+            **info,
+            "status": self.status,
+            "total": round(self.total, 3),
+            "peak_mb": round(self.peak / MB, 1),
+            "stages": [{"label": s["label"],
+                        "seconds": round(s["seconds"], 3),
+                        "python_peak_mb": round(s["python_peak"] / MB, 1),
+                        "peak_mb": round(s["peak"] / MB, 1)} for s in self.stages],
+        }
+        try:
+            with open(os.path.join(folder, STATS_LOG_NAME), "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+        except OSError as e:
+            print(f"Could not write bake stats to {folder}: {e}")
+
+
+stats = BakeStats()
@@ -0,0 +1,44 @@
+import numpy as np
+from bpy.types import Object
+
+TILE_UV_NAME = "MSFSBake_Tile_UV"
+
+
+class TiledBake:
+    # Bakes a large output one tile at a time by remapping the target UVs onto a small image.
+    # Each tile gets a border of padding texels so margins are continuous across tile edges.
+    def __init__(self, dst: Object, width: int, height: int, tile_size: int, padding: int):
+        self.width = width
+        self.height = height
+        self.tile_size = tile_size
+        self.padding = padding
+        self.size = tile_size + 2 * padding
+
+        # The bake object gets its own mesh, the cached one is left untouched
+        dst.data = dst.data.copy()
+        mesh = dst.data
+
+        base = mesh.uv_layers.active
+        self.uv = np.empty(len(base.data) * 2, dtype=np.float64)
+        base.data.foreach_get("uv", self.uv)
+        self.uv.shape = (-1, 2)
+
+        self.layer = mesh.uv_layers.new(name=TILE_UV_NAME, do_init=False)
+        mesh.uv_layers.active = self.layer
+        self.layer.active_render = True
+
+        self.tiles = [(x, y, min(x + tile_size, width), min(y + tile_size, height))
+                      for y in range(0, height, tile_size)
+                      for x in range(0, width, tile_size)]
+
+    def set_tile(self, tile: tuple[int, int, int, int]) -> None:
+        # Map the tile, plus its border, onto the whole tile image
+        x0, y0, _, _ = tile
+        uv = (self.uv * (self.width, self.height) - (x0 - self.padding, y0 - self.padding)) / self.size
+        self.layer.data.foreach_set("uv", uv.astype(np.float32).ravel())
+
+    def store(self, buffer: np.ndarray, tile: tuple[int, int, int, int], pixels: np.ndarray) -> None:
+        # Copy the inner part of the baked tile pixels into the full size buffer
+        x0, y0, x1, y1 = tile
+        inner = pixels[self.padding:self.padding + y1 - y0, self.padding:self.padding + x1 - x0]
+        buffer[y0:y1, x0:x1] = np.clip(inner * 255.0 + 0.5, 0, 255).astype(np.uint8)
@@ -0,0 +1,340 @@
+import bpy
+import bmesh
+import hashlib
+import sys
+import numpy as np
+from bpy.app.handlers import persistent
+from bpy.types import Object, Image, Mesh
+from mathutils.bvhtree import BVHTree
+
+# Candidate texels tested per rasterization batch, bounds temporary memory
+RASTER_CHUNK = 1 << 22
+
+# Used for source faces whose material slot has no texture for the map
+DEFAULT_COLOR = (0.8, 0.8, 0.8, 1.0)
+DEFAULT_NORMAL = (0.5, 0.5, 1.0, 1.0)
+
+# Correspondence maps kept around for re-bakes, keyed by mesh and bake settings, oldest dropped first
+CACHE_BYTES = 1 << 30
+_correspondence_cache : dict[str, "Correspondence"] = {}
+
+
+def ngons_triangulated(mesh: Mesh) -> Mesh:
+    # Tangents can only be computed for triangles and quads, so n-gons are split on a copy of the mesh.
+    # Quads are left alone, their tangents then match the ones Cycles bakes with.
+    totals = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get("loop_total", totals)
+    if not (totals > 4).any():
+        return mesh
+
+    copy = mesh.copy()
+    bm = bmesh.new()
+    bm.from_mesh(copy)
+    bmesh.ops.triangulate(bm, faces=[f for f in bm.faces if len(f.verts) > 4])
+    bm.to_mesh(copy)
+    bm.free()
+    return copy
+
+
+class MeshArrays:
+    # Triangulated world space copy of a mesh, including its tangent frame
+    def __init__(self, obj: Object):
+        mesh = ngons_triangulated(obj.data)
+        mesh.calc_loop_triangles()
+        mesh.calc_tangents()
+
+        n_tri = len(mesh.loop_triangles)
+        n_loop = len(mesh.loops)
+
+        self.tri_verts = np.empty(n_tri * 3, dtype=np.int32)
+        mesh.loop_triangles.foreach_get("vertices", self.tri_verts)
+        self.tri_verts.shape = (n_tri, 3)
+
+        self.tri_loops = np.empty(n_tri * 3, dtype=np.int32)
+        mesh.loop_triangles.foreach_get("loops", self.tri_loops)
+        self.tri_loops.shape = (n_tri, 3)
+
+        self.tri_material = np.empty(n_tri, dtype=np.int32)
+        mesh.loop_triangles.foreach_get("material_index", self.tri_material)
+
+        co = np.empty(len(mesh.vertices) * 3, dtype=np.float64)
+        mesh.vertices.foreach_get("co", co)
+
+        normal = np.empty(n_loop * 3, dtype=np.float64)
+        mesh.loops.foreach_get("normal", normal)
+
+        tangent = np.empty(n_loop * 3, dtype=np.float64)
+        mesh.loops.foreach_get("tangent", tangent)
+
+        self.sign = np.empty(n_loop, dtype=np.float64)
+        mesh.loops.foreach_get("bitangent_sign", self.sign)
+
+        self.uv = np.empty(n_loop * 2, dtype=np.float64)
+        mesh.uv_layers.active.data.foreach_get("uv", self.uv)
+        self.uv.shape = (n_loop, 2)
+
+        mesh.free_tangents()
+        if mesh != obj.data:
+            bpy.data.meshes.remove(mesh)
+
+        # Move everything into world space so source and target can be compared directly
+        matrix = np.array(obj.matrix_world, dtype=np.float64)
+        rot = matrix[:3, :3]
+        self.co = co.reshape(-1, 3) @ rot.T + matrix[:3, 3]
+        self.normal = normalize(normal.reshape(-1, 3) @ np.linalg.inv(rot))
+        self.tangent = normalize(tangent.reshape(-1, 3) @ rot.T)
+
+    @classmethod
+    def merged(cls, parts: list["MeshArrays"], slot_counts: list[int]) -> "MeshArrays":
+        # One set of arrays for several objects, with vertex, loop and material slot indices offset per part
+        merged = cls.__new__(cls)
+        vert_offsets = np.cumsum([0] + [len(p.co) for p in parts])
+        loop_offsets = np.cumsum([0] + [len(p.uv) for p in parts])
+        slot_offsets = np.cumsum([0] + slot_counts)
+
+        for name in ("co", "normal", "tangent", "sign", "uv"):
+            setattr(merged, name, np.concatenate([getattr(p, name) for p in parts]))
+        merged.tri_verts = np.concatenate([p.tri_verts + vert_offsets[i] for i, p in enumerate(parts)])
+        merged.tri_loops = np.concatenate([p.tri_loops + loop_offsets[i] for i, p in enumerate(parts)])
+        merged.tri_material = np.concatenate([np.minimum(p.tri_material, slot_counts[i] - 1) + slot_offsets[i]
+                                              for i, p in enumerate(parts)])
+        return merged
+
+    def signature(self) -> str:
+        digest = hashlib.sha1()
+        for arr in (self.co, self.tri_verts, self.uv):
+            digest.update(np.ascontiguousarray(arr).tobytes())
+        return digest.hexdigest()
+
+    def frame(self, tri: np.ndarray, bary: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Interpolated tangent, bitangent and normal at points on the given triangles
+        loops = self.tri_loops[tri]
+        n = normalize(np.einsum("ij,ijk->ik", bary, self.normal[loops]))
+        t = np.einsum("ij,ijk->ik", bary, self.tangent[loops])
+        t = normalize(t - n * np.einsum("ij,ij->i", n, t)[:, None])
+        b = np.cross(n, t) * self.sign[loops[:, 0]][:, None]
+        return t, b, n
+
+
+class Correspondence:
+    # For each covered target texel, the source triangle and barycentrics it maps to
+    def __init__(self, width: int, height: int, texel: np.ndarray,
+                 dst_tri: np.ndarray, dst_bary: np.ndarray,
+                 src_tri: np.ndarray, src_bary: np.ndarray):
+        # Stored compact, a large map covers tens of millions of texels
+        self.width = width
+        self.height = height
+        self.texel = texel.astype(np.int32)
+        self.dst_tri = dst_tri.astype(np.int32)
+        self.dst_bary = dst_bary.astype(np.float32)
+        self.src_tri = src_tri.astype(np.int32)
+        self.src_bary = src_bary.astype(np.float32)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.texel, self.dst_tri, self.dst_bary, self.src_tri, self.src_bary))
+
+
+class TexelTransfer:
+    # Bakes maps by sampling the source textures through a cached correspondence map,
+    # so each extra map costs a gather instead of a full Cycles pass
+    def __init__(self, src_objs: list[Object], slot_counts: list[int], ray_dist: float, extrusion: float):
+        # Several sources are ray cast as one mesh, each face keeping its own material slot
+        self.src = MeshArrays.merged([MeshArrays(obj) for obj in src_objs], slot_counts)
+        self.ray_dist = ray_dist
+        self.extrusion = extrusion
+        self.bvh = None
+        self.images : dict[str, np.ndarray] = {}
+
+    def correspondence(self, dst_obj: Object, width: int, height: int) -> Correspondence:
+        dst = MeshArrays(dst_obj)
+
+        key = f"{self.src.signature()}:{dst.signature()}:{width}x{height}:{self.ray_dist}:{self.extrusion}"
+        corr = _correspondence_cache.get(key)
+        if corr is None:
+            corr = self.build(dst, width, height)
+            while _correspondence_cache and cache_bytes() + corr.nbytes > CACHE_BYTES:
+                _correspondence_cache.pop(next(iter(_correspondence_cache)))
+            if corr.nbytes <= CACHE_BYTES:
+                _correspondence_cache[key] = corr
+
+        # The target frame is needed for tangent space normals
+        self.dst = dst
+        return corr
+
+    def build(self, dst: MeshArrays, width: int, height: int) -> Correspondence:
+        texel, dst_tri, dst_bary = rasterize(dst.uv[dst.tri_loops], width, height)
+
+        # Cast from the extruded low poly surface back along its normal
+        pos = np.einsum("ij,ijk->ik", dst_bary, dst.co[dst.tri_verts[dst_tri]])
+        _, _, nor = dst.frame(dst_tri, dst_bary)
+        origins = pos + nor * self.extrusion
+        directions = -nor
+
+        if self.bvh is None:
+            self.bvh = BVHTree.FromPolygons(self.src.co.tolist(), self.src.tri_verts.tolist(), all_triangles=True)
+
+        max_dist = self.ray_dist if self.ray_dist > 0 else sys.float_info.max
+        hit_tri = np.full(len(texel), -1, dtype=np.int32)
+        hit_pos = np.zeros((len(texel), 3), dtype=np.float64)
+        ray_cast = self.bvh.ray_cast
+        for i, (origin, direction) in enumerate(zip(origins.tolist(), directions.tolist())):
+            loc, _, index, _ = ray_cast(origin, direction, max_dist)
+            if index is not None:
+                hit_tri[i] = index
+                hit_pos[i] = loc
+
+        hit = hit_tri >= 0
+        src_tri = hit_tri[hit]
+        src_bary = barycentric(hit_pos[hit], self.src.co[self.src.tri_verts[src_tri]])
+
+        return Correspondence(width, height, texel[hit], dst_tri[hit], dst_bary[hit], src_tri, src_bary)
+
+    def transfer(self, corr: Correspondence, bake_type: str, src_images: list[Image | None]) -> np.ndarray:
+        uv = np.einsum("ij,ijk->ik", corr.src_bary, self.src.uv[self.src.tri_loops[corr.src_tri]])
+
+        # Each source face samples the texture of its own material slot
+        slots = np.minimum(self.src.tri_material[corr.src_tri], len(src_images) - 1)
+        color = np.empty((len(uv), 4), dtype=np.float32)
+        for slot, src_image in enumerate(src_images):
+            sel = slots == slot
+            if not sel.any():
+                continue
+            if src_image is None:
+                color[sel] = DEFAULT_NORMAL if bake_type == 'NORMAL' else DEFAULT_COLOR
+            else:
+                color[sel] = sample(self.image_pixels(src_image), uv[sel])
+
+        if bake_type == 'NORMAL':
+            # Source tangent space -> world -> target tangent space
+            ts = color[:, :3] * 2.0 - 1.0
+            st, sb, sn = self.src.frame(corr.src_tri, corr.src_bary)
+            world = normalize(ts[:, :1] * st + ts[:, 1:2] * sb + ts[:, 2:3] * sn)
+            dt, db, dn = self.dst.frame(corr.dst_tri, corr.dst_bary)
+            out = np.stack([np.einsum("ij,ij->i", world, axis) for axis in (dt, db, dn)], axis=1)
+            color[:, :3] = out * 0.5 + 0.5
+
+        color[:, 3] = 1.0
+
+        # Texels no face maps to stay transparent, like those a Cycles bake leaves alone
+        pixels = np.zeros((corr.height * corr.width, 4), dtype=np.float32)
+        pixels[corr.texel] = color
+        return pixels.reshape(corr.height, corr.width, 4)
+
+    def image_pixels(self, image: Image) -> np.ndarray:
+        pixels = self.images.get(image.name)
+        if pixels is None:
+            width, height = image.size
+            pixels = np.empty(width * height * 4, dtype=np.float32)
+            image.pixels.foreach_get(pixels)
+            pixels.shape = (height, width, 4)
+            self.images[image.name] = pixels
+        return pixels
+
+
+def cache_bytes() -> int:
+    return sum(corr.nbytes for corr in _correspondence_cache.values())
+
+
+def clear() -> None:
+    _correspondence_cache.clear()
+
+
+@persistent
+def on_load(_) -> None:
+    # Cached maps belong to the meshes of the previous file
+    clear()
+
+
+def register_handlers() -> None:
+    if on_load not in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.append(on_load)
+
+
+def unregister_handlers() -> None:
+    clear()
+    if on_load in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(on_load)
+
+
+def normalize(v: np.ndarray) -> np.ndarray:
+    length = np.linalg.norm(v, axis=-1, keepdims=True)
+    return v / np.maximum(length, 1e-12)
+
+
+def barycentric(p: np.ndarray, tri: np.ndarray) -> np.ndarray:
+    # Barycentric coordinates of points p (n, d) in triangles tri (n, 3, d)
+    v0 = tri[:, 1] - tri[:, 0]
+    v1 = tri[:, 2] - tri[:, 0]
+    v2 = p - tri[:, 0]
+    d00 = np.einsum("ij,ij->i", v0, v0)
+    d01 = np.einsum("ij,ij->i", v0, v1)
+    d11 = np.einsum("ij,ij->i", v1, v1)
+    d20 = np.einsum("ij,ij->i", v2, v0)
+    d21 = np.einsum("ij,ij->i", v2, v1)
+    denom = d00 * d11 - d01 * d01
+    with np.errstate(divide="ignore", invalid="ignore"):
+        l1 = (d11 * d20 - d01 * d21) / denom
+        l2 = (d00 * d21 - d01 * d20) / denom
+    bary = np.stack([1.0 - l1 - l2, l1, l2], axis=1)
+    return np.nan_to_num(bary, nan=1.0 / 3.0)
+
+
+def rasterize(uv_tris: np.ndarray, width: int, height: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Find every texel center covered by the UV triangles (n, 3, 2).
+    # Candidates come from each triangle's bounding box, expanded in batches.
+    px = uv_tris * np.array([width, height], dtype=np.float64) - 0.5
+    x0 = np.clip(np.floor(px[:, :, 0].min(axis=1)), 0, width - 1).astype(np.int64)
+    x1 = np.clip(np.ceil(px[:, :, 0].max(axis=1)), 0, width - 1).astype(np.int64)
+    y0 = np.clip(np.floor(px[:, :, 1].min(axis=1)), 0, height - 1).astype(np.int64)
+    y1 = np.clip(np.ceil(px[:, :, 1].max(axis=1)), 0, height - 1).astype(np.int64)
+    w = x1 - x0 + 1
+    counts = w * (y1 - y0 + 1)
+    cum = np.cumsum(counts)
+
+    texels, tris, barys = [], [], []
+    start = 0
+    while start < len(counts):
+        base = cum[start - 1] if start > 0 else 0
+        end = max(int(np.searchsorted(cum, base + RASTER_CHUNK, side="right")), start + 1)
+
+        ids = np.arange(start, end)
+        n = counts[start:end]
+        idx = np.repeat(ids, n)
+        off = np.arange(n.sum()) - np.repeat(cum[start:end] - n - base, n)
+        x = x0[idx] + off % w[idx]
+        y = y0[idx] + off // w[idx]
+
+        bary = barycentric(np.stack([x, y], axis=1).astype(np.float64), px[idx])
+        inside = (bary >= -1e-6).all(axis=1)
+
+        texels.append(y[inside] * width + x[inside])
+        tris.append(idx[inside])
+        barys.append(bary[inside])
+        start = end
+
+    texel = np.concatenate(texels) if texels else np.empty(0, dtype=np.int64)
+    tri = np.concatenate(tris) if tris else np.empty(0, dtype=np.int64)
+    bary = np.concatenate(barys) if barys else np.empty((0, 3), dtype=np.float64)
+
+    # Overlapping UVs, first triangle wins
+    texel, first = np.unique(texel, return_index=True)
+    return texel, tri[first], bary[first]
+
+
+def sample(pixels: np.ndarray, uv: np.ndarray) -> np.ndarray:
+    # Bilinear, wrapping lookup of (h, w, 4) pixels at uv (n, 2)
+    height, width = pixels.shape[:2]
+    x = uv[:, 0] * width - 0.5
+    y = uv[:, 1] * height - 0.5
+    xf = np.floor(x)
+    yf = np.floor(y)
+    fx = (x - xf)[:, None].astype(np.float32)
+    fy = (y - yf)[:, None].astype(np.float32)
+    xa = xf.astype(np.int64) % width
+    ya = yf.astype(np.int64) % height
+    xb = (xa + 1) % width
+    yb = (ya + 1) % height
+    top = pixels[ya, xa] * (1 - fx) + pixels[ya, xb] * fx
+    bottom = pixels[yb, xa] * (1 - fx) + pixels[yb, xb] * fx
+    return top * (1 - fy) + bottom * fy
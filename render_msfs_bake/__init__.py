@@ -1,7 +1,10 @@
 import bpy
 
-from .Settings import MSFSBake_Settings
-from .Bake import MSFSBake_Bake
+from . import MeshCache, Prefilter, Settings, Transfer
+from .Settings import MSFSBake_LodTarget, MSFSBake_Settings
+from .Bake import MSFSBake_Bake, MSFSBake_Cancel
+from .Distance import MSFSBake_EstimateDistances
+from .Preview import MSFSBake_Preview, MSFSBake_PreviewConfirm, MSFSBake_PreviewDiscard
 from .Panel import MSFSBake_Panel
 from .PanelUtils import (
     MSFSBake_ToggleObjVisHigh,
@@ -11,7 +14,9 @@ from .PanelUtils import (
     MSFSBake_WidthMinus,
     MSFSBake_WidthPlus,
     MSFSBake_HeightMinus,
-    MSFSBake_HeightPlus
+    MSFSBake_HeightPlus,
+    MSFSBake_LodAdd,
+    MSFSBake_LodRemove
 )
 
 
@@ -27,8 +32,14 @@ bl_info = {
 
 
 classes = (
+        MSFSBake_LodTarget,
         MSFSBake_Settings,
         MSFSBake_Bake,
+        MSFSBake_Cancel,
+        MSFSBake_EstimateDistances,
+        MSFSBake_Preview,
+        MSFSBake_PreviewConfirm,
+        MSFSBake_PreviewDiscard,
         MSFSBake_Panel,
         MSFSBake_ToggleObjVisHigh,
         MSFSBake_ToggleObjVisLow,
@@ -38,6 +49,8 @@ classes = (
         MSFSBake_WidthPlus,
         MSFSBake_HeightMinus,
         MSFSBake_HeightPlus,
+        MSFSBake_LodAdd,
+        MSFSBake_LodRemove,
 )
 
 
@@ -46,8 +59,16 @@ def register():
         bpy.utils.register_class(cls)
 
     bpy.types.Scene.msfs_properties = bpy.props.PointerProperty(type=MSFSBake_Settings)
+    Settings.register_handlers()
+    MeshCache.register_handlers()
+    Transfer.register_handlers()
 
 def unregister():
+    Prefilter.clear()
+    Transfer.unregister_handlers()
+    MeshCache.unregister_handlers()
+    Settings.unregister_handlers()
+
     for cls in classes:
         bpy.utils.unregister_class(cls)
 